@@ -0,0 +1,200 @@
+"""Резервные копии базы без остановки бота.
+
+Копия снимается через online backup API SQLite небольшими порциями
+страниц с паузами, поэтому блокировка базы держится очень недолго и
+обработчики не ждут. Запись в базу из другого соединения начинает такое
+копирование заново; если оно не уложилось в BACKUP_MAX_SECONDS, копия
+снимается за один шаг (одна блокировка чтения на время копирования).
+Копия проверяется (PRAGMA integrity_check), при необходимости сжимается,
+старые копии удаляются.
+
+История выпитой воды (history/, см. history.py) копируется вместе с базой
+в backups/history/: горячие партиции - так же, как база, архивы закрытых
+месяцев только для чтения - один раз, без ротации.
+
+Примеры:
+    python backup.py create
+    python backup.py restore backups/water_tracker-20240101-030000.db.gz
+    python backup.py --db history/intake-2024-01.db restore backups/history/intake-2024-01-20240115-030000.db.gz
+"""
+import argparse
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+
+from database import DB_PATH
+from history import HISTORY_DIR
+
+BACKUP_DIR = 'backups'
+# Подкаталог копий истории в каталоге копий
+HISTORY_BACKUP_DIR = 'history'
+# Страниц за один шаг и пауза между шагами
+BACKUP_PAGES_PER_STEP = 64
+BACKUP_STEP_SLEEP = 0.005
+# Сколько последних копий хранить
+BACKUP_KEEP = 7
+# Сколько секунд копировать по шагам, прежде чем скопировать за один шаг
+BACKUP_MAX_SECONDS = 60
+
+class _BackupTooSlow(Exception):
+    pass
+
+# Проверка целостности файла базы
+def check_integrity(path):
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise RuntimeError(f"Копия {path} повреждена: {result}")
+
+def _backup_name(db_path):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    return f"{base}-{time.strftime('%Y%m%d-%H%M%S')}.db"
+
+# Копирование базы через online backup API во временный файл
+def _copy_online(db_path, temp_path, pages, sleep, max_seconds):
+    started = time.monotonic()
+    steps = restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal steps, restarts, last_remaining
+        steps += 1
+        # Осталось больше, чем после прошлого шага - копирование началось заново
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+        last_remaining = remaining
+        if time.monotonic() - started > max_seconds:
+            raise _BackupTooSlow()
+
+    # Только чтение: исчезнувшая партиция (её заархивировали) не создаётся пустой
+    source = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    target = sqlite3.connect(temp_path)
+    single_step = False
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _BackupTooSlow:
+            single_step = True
+            source.backup(target, pages=-1)
+    finally:
+        target.close()
+        source.close()
+    logging.info(
+        "Копия %s: шагов %d, перезапусков %d, %.1f с%s",
+        db_path, steps, restarts, time.monotonic() - started,
+        ", завершена за один шаг" if single_step else ""
+    )
+
+# Создание резервной копии
+def create_backup(db_path=DB_PATH, backup_dir=BACKUP_DIR, compress=True, keep=BACKUP_KEEP,
+                  pages=BACKUP_PAGES_PER_STEP, sleep=BACKUP_STEP_SLEEP, max_seconds=BACKUP_MAX_SECONDS):
+    os.makedirs(backup_dir, exist_ok=True)
+    path = os.path.join(backup_dir, _backup_name(db_path))
+    temp_path = f"{path}.tmp"
+
+    # Недописанный временный файл не удалит rotate_backups - убираем его при любой ошибке
+    try:
+        _copy_online(db_path, temp_path, pages, sleep, max_seconds)
+        check_integrity(temp_path)
+        if compress:
+            path += '.gz'
+            with open(temp_path, 'rb') as plain, gzip.open(path, 'wb', compresslevel=6) as packed:
+                shutil.copyfileobj(plain, packed)
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    rotate_backups(db_path, backup_dir, keep)
+    return path
+
+# Копия истории: горячие партиции - через create_backup, новые архивы копируются
+def backup_history(history_dir=HISTORY_DIR, backup_dir=BACKUP_DIR, compress=True, keep=BACKUP_KEEP):
+    target_dir = os.path.join(backup_dir, HISTORY_BACKUP_DIR)
+    os.makedirs(target_dir, exist_ok=True)
+    paths = []
+    for path in sorted(glob.glob(os.path.join(history_dir, 'intake-*.db'))):
+        paths.append(create_backup(path, target_dir, compress, keep))
+
+    for archive in sorted(glob.glob(os.path.join(history_dir, 'intake-*.db.gz'))):
+        copy_path = os.path.join(target_dir, os.path.basename(archive))
+        # Архив не меняется - достаточно одной копии
+        if os.path.exists(copy_path):
+            continue
+        temp_path = f"{copy_path}.tmp"
+        try:
+            shutil.copyfile(archive, temp_path)
+            os.replace(temp_path, copy_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        # Копии месяца, снятые, пока он был горячей партицией, больше не нужны
+        rotate_backups(archive[:-len('.gz')], target_dir, keep=0)
+        paths.append(copy_path)
+    return paths
+
+# Удаление старых копий (остаются `keep` последних)
+def rotate_backups(db_path=DB_PATH, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    backups = (
+        glob.glob(os.path.join(backup_dir, f"{base}-*.db")) +
+        glob.glob(os.path.join(backup_dir, f"{base}-*.db.gz"))
+    )
+    # Имена содержат время создания, поэтому сортировка по имени = по времени
+    backups.sort(key=lambda path: os.path.basename(path).split('.')[0])
+    removed = backups[:-keep] if keep > 0 else backups
+    for path in removed:
+        os.remove(path)
+    return removed
+
+# Восстановление из копии: проверка и атомарная замена файла базы
+def restore_backup(backup_path, db_path=DB_PATH):
+    """Бот должен быть остановлен: открытые соединения продолжат видеть старый файл"""
+    directory = os.path.dirname(os.path.abspath(db_path))
+    temp_path = os.path.join(directory, f".{os.path.basename(db_path)}.restore")
+    opener = gzip.open if backup_path.endswith('.gz') else open
+    try:
+        with opener(backup_path, 'rb') as source, open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+            target.flush()
+            os.fsync(target.fileno())
+        check_integrity(temp_path)
+        os.replace(temp_path, db_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервные копии базы")
+    parser.add_argument('--db', default=DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="создать копию")
+    create.add_argument('--dir', default=BACKUP_DIR)
+    create.add_argument('--no-compress', action='store_true')
+    create.add_argument('--keep', type=int, default=BACKUP_KEEP)
+    create.add_argument('--history-dir', default=HISTORY_DIR)
+    restore = commands.add_parser('restore', help="проверить копию и подменить ею базу")
+    restore.add_argument('backup')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        print(create_backup(args.db, args.dir, not args.no_compress, args.keep))
+        for path in backup_history(args.history_dir, args.dir, not args.no_compress, args.keep):
+            print(path)
+    else:
+        restore_backup(args.backup, args.db)
+        print(f"База {args.db} восстановлена из {args.backup}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Догоняющая отправка напоминаний, пропущенных во время простоя бота.
+
+После каждого тика планировщик сохраняет последнюю обработанную минуту
+(watermark). При запуске пропущенные напоминания между watermark и текущим
+временем находятся индексированным запросом и обрабатываются по политике:
+
+    skip     - пропустить
+    coalesce - одно сообщение на пользователя со всеми пропущенными
+    spread   - каждое пропущенное напоминание отдельно, равномерно по окну
+
+Отправка в любом случае ограничена по скорости, чтобы перезапуск
+не упирался в лимиты Telegram.
+"""
+from collections import deque
+
+from config import CATCHUP_POLICIES as POLICIES
+from database import iter_window_rows
+from scheduler import (
+    MINUTES_PER_DAY,
+    parse_time_minutes,
+    reminder_minute,
+    first_reminder_index,
+    user_reminder_count
+)
+
+SKIP, COALESCE, SPREAD = POLICIES
+
+# Напоминания старше этого срока не догоняем
+MAX_CATCHUP_MINUTES = 180
+# Максимум догоняющих сообщений в секунду
+MAX_SEND_RATE = 20
+# Окно, по которому распределяются напоминания в политике spread
+SPREAD_SECONDS = 15 * 60
+
+def _hhmm(minute_of_day):
+    return f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}"
+
+# Пропущенные напоминания за абсолютные минуты [from_minute, to_minute]
+def missed_reminders(conn, from_minute, to_minute):
+    """Возвращает {chat_id: количество пропущенных напоминаний}"""
+    missed = {}
+    minute = from_minute
+    while minute <= to_minute:
+        # Отрезок в пределах одних суток
+        day_base = minute - minute % MINUTES_PER_DAY
+        segment_end = min(to_minute, day_base + MINUTES_PER_DAY - 1)
+        first = minute - day_base
+        last = segment_end - day_base
+        for chat_id, weight, activity_level, start_time, end_time in iter_window_rows(conn, _hhmm(first), _hhmm(last)):
+            start = parse_time_minutes(start_time)
+            end = parse_time_minutes(end_time)
+            count = user_reminder_count(weight, activity_level)
+            index = first_reminder_index(start, end, count, first)
+            while index < count and reminder_minute(start, end, count, index) <= last:
+                missed[chat_id] = missed.get(chat_id, 0) + 1
+                index += 1
+        minute = segment_end + 1
+    return missed
+
+# Диапазон минут, которые нужно догнать после простоя
+def catchup_range(watermark, now_minute, max_minutes=MAX_CATCHUP_MINUTES):
+    if watermark is None:
+        return None
+    from_minute = max(watermark + 1, now_minute - max_minutes)
+    to_minute = now_minute - 1
+    if from_minute > to_minute:
+        return None
+    return from_minute, to_minute
+
+# План отправки: [(задержка в секундах, chat_id, количество напоминаний)]
+def plan_catchup(missed, policy, rate=MAX_SEND_RATE, spread_seconds=SPREAD_SECONDS):
+    if policy not in POLICIES:
+        raise ValueError(f"Неизвестная политика догоняющей отправки: {policy}")
+    if policy == SKIP:
+        return []
+
+    if policy == COALESCE:
+        wanted = [(0.0, chat_id, count) for chat_id, count in missed.items()]
+    else:
+        wanted = []
+        for chat_id, count in missed.items():
+            step = spread_seconds / count
+            wanted.extend((i * step, chat_id, 1) for i in range(count))
+        wanted.sort(key=lambda item: item[0])
+
+    # Не больше `rate` сообщений в секунду
+    plan = []
+    interval = 1.0 / rate
+    previous = -interval
+    for delay, chat_id, count in wanted:
+        previous = max(delay, previous + interval)
+        plan.append((previous, chat_id, count))
+    return plan
+
+class CatchupQueue:
+    """Очередь догоняющих сообщений, разбираемая по времени"""
+
+    def __init__(self, plan, started_at):
+        self._items = deque(plan)
+        self._started_at = started_at
+
+    def __len__(self):
+        return len(self._items)
+
+    # Элементы, время отправки которых уже наступило
+    def pop_due(self, now):
+        elapsed = now - self._started_at
+        due = []
+        while self._items and self._items[0][0] <= elapsed:
+            _, chat_id, count = self._items.popleft()
+            due.append((chat_id, count))
+        return due
+
+    # Ещё не отправленные напоминания {chat_id: количество} (для сохранения при остановке)
+    def remaining(self):
+        pending = {}
+        for _, chat_id, count in self._items:
+            pending[chat_id] = pending.get(chat_id, 0) + count
+        return pending
@@ -0,0 +1,221 @@
+"""Групповые соревнования по выполнению дневной нормы воды.
+
+Участник группы получает очки за день - долю выпитого от своей нормы
+(в промилле, максимум 1000). При равенстве выше тот, кто набрал очки раньше.
+
+Рейтинг группы за день хранится в памяти как отсортированный список и
+обновляется точечно при каждой записи выпитой воды: место пользователя
+находится бинарным поиском, полный пересчёт по участникам не нужен.
+Очки пользователя за день - одна строка в daily_scores, которая
+перезаписывается только при изменении очков; рейтинг группы при первом
+обращении собирается одним запросом.
+"""
+import sqlite3
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from database import DB_PATH
+
+# Максимум очков за день (норма выполнена)
+MAX_SCORE = 1000
+# Сколько рейтингов групп держать в памяти
+BOARD_CACHE_SIZE = 1000
+# Сколько дней хранить очки
+SCORES_KEEP_DAYS = 7
+
+class Leaderboard:
+    """Рейтинг: записи (-очки, время достижения, user_id) по возрастанию"""
+
+    def __init__(self):
+        self._entries = []
+        self._keys = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Место (с 1) или None, если пользователя нет в рейтинге
+    def rank(self, user_id):
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self._entries, key) + 1
+
+    def score(self, user_id):
+        key = self._keys.get(user_id)
+        return -key[0] if key else 0
+
+    # Обновление очков; возвращает (старое место, новое место)
+    def update(self, user_id, score, reached_at):
+        old_key = self._keys.get(user_id)
+        old_rank = None
+        if old_key is not None:
+            if -old_key[0] == score:
+                rank = self.rank(user_id)
+                return rank, rank
+            old_rank = bisect_left(self._entries, old_key) + 1
+            del self._entries[old_rank - 1]
+        key = (-score, reached_at, user_id)
+        insort(self._entries, key)
+        self._keys[user_id] = key
+        return old_rank, bisect_left(self._entries, key) + 1
+
+    def remove(self, user_id):
+        key = self._keys.pop(user_id, None)
+        if key is not None:
+            del self._entries[bisect_left(self._entries, key)]
+
+    # Первые k мест: [(место, user_id, очки)]
+    def top(self, k=10):
+        return [(rank, user_id, -score) for rank, (score, _, user_id) in enumerate(self._entries[:k], 1)]
+
+# Очки за день по выпитому объёму и норме
+def adherence_score(drunk_ml, norm_ml):
+    if norm_ml <= 0:
+        return 0
+    return min(MAX_SCORE, int(drunk_ml * MAX_SCORE / norm_ml))
+
+class Challenges:
+    def __init__(self, db_path=DB_PATH, cache_size=BOARD_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        # group_id -> (день, Leaderboard), вытеснение давно не использованных
+        self._boards = OrderedDict()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    # Рейтинг группы за день (загружается при первом обращении)
+    def board(self, group_id, day=None):
+        day = day or date.today()
+        cached = self._boards.get(group_id)
+        if cached is not None and cached[0] == day:
+            self._boards.move_to_end(group_id)
+            return cached[1]
+
+        board = Leaderboard()
+        conn = self._connect()
+        rows = conn.execute('''
+        SELECT s.user_id, s.score, s.reached_at
+        FROM group_members m
+        JOIN daily_scores s ON s.day = ? AND s.user_id = m.user_id
+        WHERE m.group_id = ?
+        ''', (day.isoformat(), group_id))
+        for user_id, score, reached_at in rows:
+            board.update(user_id, score, reached_at)
+        conn.close()
+
+        self._boards[group_id] = (day, board)
+        self._boards.move_to_end(group_id)
+        while len(self._boards) > self.cache_size:
+            self._boards.popitem(last=False)
+        return board
+
+    def join(self, group_id, title, user_id):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO challenge_groups (group_id, title) VALUES (?, ?)",
+            (group_id, title)
+        )
+        conn.execute("UPDATE challenge_groups SET title = ? WHERE group_id = ?", (title, group_id))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)",
+            (group_id, user_id)
+        )
+        joined = cursor.rowcount > 0
+        row = conn.execute(
+            "SELECT score, reached_at FROM daily_scores WHERE day = ? AND user_id = ?",
+            (date.today().isoformat(), user_id)
+        ).fetchone()
+        conn.commit()
+        conn.close()
+
+        # Уже загруженный рейтинг дополняется точечно
+        cached = self._boards.get(group_id)
+        if cached is not None and row is not None:
+            cached[1].update(user_id, row[0], row[1])
+        return joined
+
+    def leave(self, group_id, user_id):
+        conn = self._connect()
+        cursor = conn.execute(
+            "DELETE FROM group_members WHERE group_id = ? AND user_id = ?",
+            (group_id, user_id)
+        )
+        left = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        cached = self._boards.get(group_id)
+        if cached is not None:
+            cached[1].remove(user_id)
+        return left
+
+    # Новые очки пользователя за сегодня; возвращает изменения мест по группам
+    def record_score(self, user_id, score, day=None):
+        """[(group_id, название, старое место, новое место, участников в рейтинге)]"""
+        day = day or date.today()
+        reached_at = time.time_ns()
+        conn = self._connect()
+        groups = conn.execute('''
+        SELECT g.group_id, g.title
+        FROM group_members m
+        JOIN challenge_groups g ON g.group_id = m.group_id
+        WHERE m.user_id = ?
+        ''', (user_id,)).fetchall()
+        stored = conn.execute(
+            "SELECT score FROM daily_scores WHERE day = ? AND user_id = ?",
+            (day.isoformat(), user_id)
+        ).fetchone()
+        conn.close()
+
+        # Рейтинги загружаются до записи новых очков, чтобы видеть прежнее место
+        boards = [(group_id, title, self.board(group_id, day)) for group_id, title in groups]
+
+        # Очки не изменились (например, норма уже выполнена) - база не трогается
+        if stored is None or stored[0] != score:
+            conn = self._connect()
+            conn.execute('''
+            INSERT INTO daily_scores (day, user_id, score, reached_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (day, user_id) DO UPDATE SET score = excluded.score, reached_at = excluded.reached_at
+            WHERE score != excluded.score
+            ''', (day.isoformat(), user_id, score, reached_at))
+            conn.commit()
+            conn.close()
+
+        changes = []
+        for group_id, title, board in boards:
+            old_rank, new_rank = board.update(user_id, score, reached_at)
+            changes.append((group_id, title, old_rank, new_rank, len(board)))
+        return changes
+
+    # Первые k мест группы с именами: [(место, имя, очки)]
+    def top(self, group_id, k=10):
+        entries = self.board(group_id).top(k)
+        if not entries:
+            return []
+        conn = self._connect()
+        names = dict(conn.execute(
+            f"SELECT chat_id, first_name FROM users WHERE chat_id IN ({','.join('?' * len(entries))})",
+            [user_id for _, user_id, _ in entries]
+        ))
+        conn.close()
+        return [(rank, names.get(user_id, str(user_id)), score) for rank, user_id, score in entries]
+
+    def members_count(self, group_id):
+        conn = self._connect()
+        count = conn.execute("SELECT COUNT(*) FROM group_members WHERE group_id = ?", (group_id,)).fetchone()[0]
+        conn.close()
+        return count
+
+    # Удаление старых очков
+    def prune_scores(self, keep_days=SCORES_KEEP_DAYS):
+        conn = self._connect()
+        cursor = conn.execute(
+            "DELETE FROM daily_scores WHERE day < ?",
+            ((date.today() - timedelta(days=keep_days)).isoformat(),)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return deleted
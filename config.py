@@ -0,0 +1,106 @@
+"""Настройки бота из файла и переменных окружения.
+
+Порядок (каждый следующий источник переопределяет предыдущий):
+значения по умолчанию, JSON-файл (путь в CONFIG_PATH, по умолчанию
+config.json, если он есть), переменные окружения с теми же именами
+в верхнем регистре (BOT_TOKEN, DB_PATH, ...).
+
+Пример config.json:
+    {"bot_token": "123:ABC", "db_path": "/var/lib/water/water_tracker.db", "health_port": 8080}
+
+Дополнительные боты того же процесса (см. tenants.py) задаются списком
+tenants; в окружении TENANTS - тот же список в JSON.
+"""
+import json
+import os
+import re
+from collections import namedtuple
+
+CONFIG_PATH = 'config.json'
+
+# Политики догоняющей отправки (см. catchup.py)
+CATCHUP_POLICIES = ('skip', 'coalesce', 'spread')
+
+# Имя основного бота (bot_token); для ботов из списка tenants оно занято
+MAIN_TENANT = 'main'
+TENANT_NAME = re.compile(r'[a-z0-9][a-z0-9_-]{0,31}')
+
+TenantConfig = namedtuple('TenantConfig', 'name bot_token rate_limit')
+
+# Список chat_id: строка через запятую (окружение) или список (файл)
+def _chat_ids(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return frozenset(int(chat_id) for chat_id in value)
+    return frozenset(int(chat_id) for chat_id in str(value).split(',') if chat_id.strip())
+
+# Боты партнёров: [{"name": ..., "bot_token": ..., "rate_limit": ...}];
+# rate_limit (сообщений в секунду) можно не указывать
+def _tenants(value):
+    if isinstance(value, str):
+        value = json.loads(value)
+    tenants = []
+    for item in value:
+        unknown = set(item) - set(TenantConfig._fields)
+        if unknown:
+            raise ValueError(f"tenants: неизвестные поля: {', '.join(sorted(unknown))}")
+        name = item.get('name') or ''
+        if not TENANT_NAME.fullmatch(name) or name == MAIN_TENANT:
+            raise ValueError(f"tenants: недопустимое имя бота {name!r}")
+        if any(tenant.name == name for tenant in tenants):
+            raise ValueError(f"tenants: имя {name} повторяется")
+        if not item.get('bot_token'):
+            raise ValueError(f"tenants: у бота {name} нет bot_token")
+        rate_limit = item.get('rate_limit')
+        tenants.append(TenantConfig(name, str(item['bot_token']), None if rate_limit is None else float(rate_limit)))
+    return tuple(tenants)
+
+def _catchup_policy(value):
+    if value not in CATCHUP_POLICIES:
+        raise ValueError(f"catchup_policy: {value!r}, допустимо: {', '.join(CATCHUP_POLICIES)}")
+    return value
+
+# Имя настройки -> (значение по умолчанию, преобразование значения)
+SETTINGS = {
+    'bot_token': (None, str),
+    'db_path': ('water_tracker.db', str),
+    'admin_chat_ids': (frozenset(), _chat_ids),
+    'catchup_policy': ('coalesce', _catchup_policy),
+    'schedule_snapshot_path': ('schedule.snapshot', str),
+    # Адрес HTTP-проверок /healthz и /readyz (без авторизации); по умолчанию
+    # выключены, для проверок извне контейнера - health_host 0.0.0.0
+    'health_host': ('127.0.0.1', str),
+    'health_port': (0, int),
+    # За сколько секунд бот должен завершиться после SIGTERM
+    'shutdown_timeout': (25.0, float),
+    # Дополнительные боты и каталог с их данными (tenants_dir/<имя>/)
+    'tenants': ((), _tenants),
+    'tenants_dir': ('tenants', str),
+    # Исходящих запросов к Telegram в секунду на бота по умолчанию
+    'rate_limit': (25.0, float),
+}
+
+Config = namedtuple('Config', list(SETTINGS))
+
+def load_config(path=None, environ=None):
+    environ = os.environ if environ is None else environ
+    path = path or environ.get('CONFIG_PATH', CONFIG_PATH)
+    values = {name: default for name, (default, _) in SETTINGS.items()}
+
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        unknown = set(data) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"{path}: неизвестные настройки: {', '.join(sorted(unknown))}")
+        for name, value in data.items():
+            values[name] = SETTINGS[name][1](value) if value is not None else None
+
+    for name, (_, convert) in SETTINGS.items():
+        value = environ.get(name.upper())
+        if value is not None and value != '':
+            values[name] = convert(value)
+
+    return Config(**values)
+
+# Настройки процесса (читаются один раз при импорте)
+CONFIG = load_config()
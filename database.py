@@ -0,0 +1,290 @@
+import json
+import sqlite3
+
+from config import CONFIG
+
+# Путь к базе данных по умолчанию (настройка db_path)
+DB_PATH = CONFIG.db_path
+
+# Версия схемы (PRAGMA user_version); миграции выполняются, только если база старее
+SCHEMA_VERSION = 2
+
+# Схема таблицы пользователей
+USERS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    chat_id INTEGER PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    weight REAL NOT NULL,
+    height REAL NOT NULL,
+    gender TEXT NOT NULL,
+    activity_level TEXT NOT NULL,
+    start_time TEXT NOT NULL DEFAULT '08:00',
+    end_time TEXT NOT NULL DEFAULT '22:00',
+    city TEXT,
+    city_id TEXT,
+    language_code TEXT
+)
+'''
+
+# Индекс по окну уведомлений (поиск пропущенных напоминаний)
+USERS_WINDOW_INDEX = '''
+CREATE INDEX IF NOT EXISTS idx_users_window ON users (start_time, end_time)
+'''
+
+# Служебное состояние рассылки (например, последняя обработанная минута)
+DISPATCH_STATE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS dispatch_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+)
+'''
+
+# Исходящие события об изменениях (transactional outbox) и курсоры потребителей.
+# AUTOINCREMENT: после сжатия пустой таблицы id не начинаются заново с 1,
+# иначе новые события оказались бы позади курсоров потребителей
+OUTBOX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    event_type TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    payload TEXT NOT NULL
+)
+'''
+
+OUTBOX_CONSUMERS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox_consumers (
+    name TEXT PRIMARY KEY,
+    acked_id INTEGER NOT NULL DEFAULT 0
+)
+'''
+
+# Групповые соревнования: группы, участники и очки за день
+CHALLENGES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS challenge_groups (
+    group_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members (user_id);
+CREATE TABLE IF NOT EXISTS daily_scores (
+    day TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    reached_at INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+'''
+
+# Догоняющие напоминания, не отправленные до остановки бота
+PENDING_REMINDERS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pending_reminders (
+    chat_id INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+)
+'''
+
+# Колонки, добавленные после первой версии схемы (для старых баз)
+ADDED_COLUMNS = {
+    'city_id': 'TEXT',
+    'language_code': 'TEXT'
+}
+
+# Пересоздание outbox версии 1 (id без AUTOINCREMENT); следующий id - после
+# всех существующих событий и курсоров потребителей
+def _migrate_outbox(cursor):
+    row = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'outbox'").fetchone()
+    if row is None or 'AUTOINCREMENT' in row[0].upper():
+        return
+    cursor.execute("ALTER TABLE outbox RENAME TO outbox_v1")
+    cursor.execute(OUTBOX_SCHEMA)
+    cursor.execute(
+        "INSERT INTO outbox (id, created_at, event_type, chat_id, payload) "
+        "SELECT id, created_at, event_type, chat_id, payload FROM outbox_v1"
+    )
+    cursor.execute("DROP TABLE outbox_v1")
+    last_id = cursor.execute(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM outbox), 0), "
+        "COALESCE((SELECT MAX(acked_id) FROM outbox_consumers), 0))"
+    ).fetchone()[0]
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'outbox'")
+    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('outbox', ?)", (last_id,))
+
+# Инициализация базы данных
+def init_db(db_path=DB_PATH):
+    """Возвращает True, если схема создавалась или обновлялась"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # Актуальная база: только одно чтение заголовка вместо прохода по таблицам
+    if cursor.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        conn.close()
+        return False
+    cursor.execute(USERS_SCHEMA)
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(users)")}
+    for column, column_type in ADDED_COLUMNS.items():
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE users ADD COLUMN {column} {column_type}")
+    # Время вида '8:00' приводим к '08:00', чтобы строки сравнивались как время
+    cursor.execute("UPDATE users SET start_time = '0' || start_time WHERE length(start_time) = 4")
+    cursor.execute("UPDATE users SET end_time = '0' || end_time WHERE length(end_time) = 4")
+    cursor.execute(USERS_WINDOW_INDEX)
+    cursor.execute(DISPATCH_STATE_SCHEMA)
+    cursor.execute("INSERT OR IGNORE INTO dispatch_state (key, value) VALUES ('profile_version', 0)")
+    cursor.execute(OUTBOX_CONSUMERS_SCHEMA)
+    _migrate_outbox(cursor)
+    cursor.execute(OUTBOX_SCHEMA)
+    cursor.executescript(CHALLENGES_SCHEMA)
+    cursor.execute(PENDING_REMINDERS_SCHEMA)
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+    conn.close()
+    return True
+
+# Получение данных пользователя
+def get_user(chat_id, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM users WHERE chat_id = ?", (chat_id,))
+    user = cursor.fetchone()
+    conn.close()
+    return user
+
+# Сохранение данных пользователя
+def save_user(chat_id, first_name, weight, height, gender, activity, start_time='08:00', end_time='22:00', city=None, city_id=None, language_code=None, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM users WHERE chat_id = ?", (chat_id,))
+    exists = cursor.fetchone() is not None
+    cursor.execute('''
+    INSERT OR REPLACE INTO users
+    (chat_id, first_name, weight, height, gender, activity_level, start_time, end_time, city, city_id, language_code)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (chat_id, first_name, weight, height, gender, activity, start_time, end_time, city, city_id, language_code))
+    append_event(cursor, 'profile_updated' if exists else 'profile_created', chat_id, {
+        'first_name': first_name,
+        'weight': weight,
+        'height': height,
+        'gender': gender,
+        'activity_level': activity,
+        'start_time': start_time,
+        'end_time': end_time,
+        'city': city,
+        'city_id': city_id,
+        'language_code': language_code
+    })
+    _bump_profile_version(cursor)
+    conn.commit()
+    conn.close()
+
+# Запись события в outbox - вызывается в транзакции самого изменения
+def append_event(cursor, event_type, chat_id, payload):
+    cursor.execute(
+        "INSERT INTO outbox (event_type, chat_id, payload) VALUES (?, ?, ?)",
+        (event_type, chat_id, json.dumps(payload, ensure_ascii=False))
+    )
+
+# Счётчик изменений профилей (в той же транзакции, что и изменение);
+# по нему проверяется актуальность снимка расписания
+def _bump_profile_version(cursor):
+    cursor.execute("UPDATE dispatch_state SET value = value + 1 WHERE key = 'profile_version'")
+
+def get_profile_version(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM dispatch_state WHERE key = 'profile_version'")
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+# Колонки профиля, которые можно менять после регистрации (/settings, язык)
+UPDATABLE_COLUMNS = ('weight', 'activity_level', 'start_time', 'end_time', 'city', 'city_id', 'language_code')
+
+# Частичное обновление профиля: UPDATE только переданных колонок
+def update_user(chat_id, db_path=DB_PATH, **fields):
+    unknown = set(fields) - set(UPDATABLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Нельзя обновить колонки: {', '.join(sorted(unknown))}")
+    assignments = ', '.join(f"{column} = ?" for column in fields)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"UPDATE users SET {assignments} WHERE chat_id = ?",
+        (*fields.values(), chat_id)
+    )
+    updated = cursor.rowcount > 0
+    if updated:
+        append_event(cursor, 'profile_updated', chat_id, fields)
+        _bump_profile_version(cursor)
+    conn.commit()
+    conn.close()
+    return updated
+
+# Данные для планировщика напоминаний (только нужные колонки)
+def iter_schedule_rows(conn, batch_size=10000):
+    """Потоковое чтение профилей для загрузки расписания"""
+    cursor = conn.execute(
+        "SELECT chat_id, weight, activity_level, start_time, end_time FROM users ORDER BY chat_id"
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield from rows
+
+# Языки пользователей (только у кого он известен)
+def iter_language_codes(conn):
+    yield from conn.execute(
+        "SELECT chat_id, language_code FROM users WHERE language_code IS NOT NULL"
+    )
+
+# Последняя обработанная планировщиком абсолютная минута
+def get_watermark(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT value FROM dispatch_state WHERE key = 'last_dispatched_minute'")
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def set_watermark(minute, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT OR REPLACE INTO dispatch_state (key, value) VALUES ('last_dispatched_minute', ?)",
+        (minute,)
+    )
+    conn.commit()
+    conn.close()
+
+# Пользователи, у которых окно уведомлений пересекается с [from_time, to_time]
+def iter_window_rows(conn, from_time, to_time):
+    """Время в формате 'ЧЧ:ММ'; использует индекс idx_users_window"""
+    cursor = conn.execute(
+        "SELECT chat_id, weight, activity_level, start_time, end_time FROM users "
+        "WHERE start_time <= ? AND end_time >= ?",
+        (to_time, from_time)
+    )
+    yield from cursor
+
+# Сохранение неотправленных догоняющих напоминаний {chat_id: количество}
+def save_pending_reminders(pending, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO pending_reminders (chat_id, count) VALUES (?, ?) "
+        "ON CONFLICT (chat_id) DO UPDATE SET count = count + excluded.count",
+        pending.items()
+    )
+    conn.commit()
+    conn.close()
+
+# Чтение и удаление сохранённых догоняющих напоминаний
+def take_pending_reminders(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    pending = dict(conn.execute("SELECT chat_id, count FROM pending_reminders"))
+    conn.execute("DELETE FROM pending_reminders")
+    conn.commit()
+    conn.close()
+    return pending
@@ -0,0 +1,141 @@
+"""Офлайн-справочник городов.
+
+Данные лежат в data/cities.tsv (id, название, варианты названия, широта,
+долгота, часовой пояс). Индекс строится лениво при первом обращении,
+поэтому не замедляет запуск бота.
+"""
+import os
+from bisect import bisect_left
+from collections import namedtuple
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cities.tsv')
+
+City = namedtuple('City', ['id', 'name', 'latitude', 'longitude', 'timezone'])
+
+# Транслитерация для сопоставления латиницы с русскими названиями
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya'
+}
+
+# Минимальная схожесть по триграммам для нечёткого совпадения; перестановка
+# двух соседних букв в коротком названии даёт около 0.27 («мосвка» - «москва»)
+FUZZY_THRESHOLD = 0.2
+
+# Приведение названия к ключу поиска
+def normalize(name):
+    name = name.lower().replace('ё', 'е').replace('-', ' ')
+    return ' '.join(name.split())
+
+def transliterate(key):
+    return ''.join(_TRANSLIT.get(char, char) for char in key)
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class CityIndex:
+    """Точный, префиксный и триграммный индекс по названиям городов"""
+
+    def __init__(self, rows):
+        self.cities = []
+        self.by_id = {}
+        self._by_key = {}
+        for city_id, name, alt_names, latitude, longitude, timezone in rows:
+            city = City(city_id, name, float(latitude), float(longitude), timezone)
+            position = len(self.cities)
+            self.cities.append(city)
+            self.by_id[city_id] = city
+            names = [name] + [alt for alt in alt_names.split(',') if alt]
+            for variant in names:
+                key = normalize(variant)
+                self._by_key.setdefault(key, position)
+                self._by_key.setdefault(transliterate(key), position)
+
+        # Отсортированные ключи для автодополнения по префиксу
+        self._keys = sorted(self._by_key)
+        self._key_cities = [self._by_key[key] for key in self._keys]
+
+        # Обратный индекс: триграмма -> номера ключей
+        postings = {}
+        self._key_trigram_counts = []
+        for key_position, key in enumerate(self._keys):
+            grams = _trigrams(key)
+            self._key_trigram_counts.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(key_position)
+        self._postings = {gram: tuple(items) for gram, items in postings.items()}
+
+    @classmethod
+    def from_file(cls, path=CITIES_PATH):
+        with open(path, encoding='utf-8') as file:
+            rows = [
+                line.rstrip('\n').split('\t')
+                for line in file
+                if line.strip() and not line.startswith('#')
+            ]
+        return cls(rows)
+
+    # Точное совпадение (с учётом регистра, ё/е, дефисов и транслита)
+    def resolve(self, text):
+        key = normalize(text)
+        position = self._by_key.get(key)
+        if position is None:
+            position = self._by_key.get(transliterate(key))
+        return self.cities[position] if position is not None else None
+
+    # Варианты для кнопок: сначала по префиксу, затем нечёткие совпадения
+    def suggest(self, text, limit=5):
+        key = normalize(text)
+        if not key:
+            return []
+        found = []
+        for query in dict.fromkeys((key, transliterate(key))):
+            self._collect_prefix(query, found, limit)
+        if len(found) < limit:
+            for position in self._fuzzy(key):
+                if position not in found:
+                    found.append(position)
+                if len(found) >= limit:
+                    break
+        return [self.cities[position] for position in found[:limit]]
+
+    def _collect_prefix(self, prefix, found, limit):
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and len(found) < limit:
+            if not self._keys[index].startswith(prefix):
+                break
+            position = self._key_cities[index]
+            if position not in found:
+                found.append(position)
+            index += 1
+
+    def _fuzzy(self, key):
+        scores = {}
+        for query in dict.fromkeys((key, transliterate(key))):
+            grams = _trigrams(query)
+            shared = {}
+            for gram in grams:
+                for key_position in self._postings.get(gram, ()):
+                    shared[key_position] = shared.get(key_position, 0) + 1
+            for key_position, common in shared.items():
+                # Коэффициент Жаккара по множествам триграмм
+                score = common / (len(grams) + self._key_trigram_counts[key_position] - common)
+                if score < FUZZY_THRESHOLD:
+                    continue
+                position = self._key_cities[key_position]
+                if score > scores.get(position, 0):
+                    scores[position] = score
+        return sorted(scores, key=scores.get, reverse=True)
+
+_index = None
+
+# Ленивая загрузка индекса при первом обращении
+def get_index():
+    global _index
+    if _index is None:
+        _index = CityIndex.from_file()
+    return _index
@@ -0,0 +1,112 @@
+"""Состояние процесса для оркестратора: фазы запуска и HTTP-проверки.
+
+    /healthz - процесс жив, цикл событий отвечает (всегда 200)
+    /readyz  - 200, когда боты принимают обновления и их напоминания
+               запланированы; 503 во время запуска и после сигнала остановки
+
+В теле ответа - JSON с длительностью фаз запуска. Сервер на asyncio,
+без внешних зависимостей. Включается настройкой health_port (по умолчанию
+выключен и слушает только 127.0.0.1, см. config.py).
+"""
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from time import monotonic
+
+# Время на чтение запроса, сек
+REQUEST_TIMEOUT = 5
+
+class Lifecycle:
+    """Фазы запуска с длительностью, готовность и остановка процесса"""
+
+    def __init__(self):
+        self.started_at = monotonic()
+        self.phases = []
+        self.ready = False
+        # Боты, у которых расписание напоминаний ещё загружается
+        self.warming = set()
+        self.draining = False
+        self.drain_started_at = None
+
+    # Замер фазы запуска
+    @contextmanager
+    def phase(self, name):
+        started = monotonic()
+        try:
+            yield
+        finally:
+            elapsed = monotonic() - started
+            self.phases.append((name, elapsed))
+            logging.info("Запуск: %s - %.1f мс", name, elapsed * 1000)
+
+    def mark_ready(self):
+        self.ready = True
+        elapsed = monotonic() - self.started_at
+        self.phases.append(('ready', elapsed))
+        logging.info("Бот готов принимать обновления через %.1f мс после старта", elapsed * 1000)
+
+    def start_warm_up(self, name):
+        self.warming.add(name)
+
+    def finish_warm_up(self, name):
+        self.warming.discard(name)
+
+    def start_draining(self):
+        self.draining = True
+        self.drain_started_at = monotonic()
+
+    @property
+    def accepting(self):
+        return self.ready and not self.warming and not self.draining
+
+    def status(self):
+        return {
+            'ready': self.accepting,
+            'warming': sorted(self.warming),
+            'draining': self.draining,
+            'uptime_seconds': round(monotonic() - self.started_at, 1),
+            'phases_ms': {name: round(elapsed * 1000, 1) for name, elapsed in self.phases}
+        }
+
+_REASONS = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}
+
+async def _handle(lifecycle, reader, writer):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+        # Заголовки не нужны, но их надо дочитать
+        while True:
+            line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            if line in (b'\r\n', b'\n', b''):
+                break
+        parts = request_line.decode('latin-1').split()
+        path = parts[1].split('?')[0] if len(parts) > 1 else '/'
+
+        if path == '/healthz':
+            status = 200
+        elif path == '/readyz':
+            status = 200 if lifecycle.accepting else 503
+        else:
+            status = 404
+        body = json.dumps(lifecycle.status()).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+# Запуск HTTP-сервера проверок; возвращает asyncio.Server
+async def start_health_server(lifecycle, host, port):
+    server = await asyncio.start_server(
+        lambda reader, writer: _handle(lifecycle, reader, writer),
+        host,
+        port
+    )
+    logging.info("Проверки состояния: http://%s:%d/healthz, /readyz", host, port)
+    return server
@@ -0,0 +1,184 @@
+"""История выпитой воды, разбитая по месяцам.
+
+Каждый месяц хранится в отдельном файле SQLite (history/intake-ГГГГ-ММ.db),
+основная база water_tracker.db при этом остаётся маленькой. Запись идёт
+через ATTACH к основной базе, поэтому событие в outbox и строка истории
+фиксируются одной транзакцией.
+
+Закрытые месяцы сжимаются (VACUUM INTO + gzip) в архивы только для чтения.
+Запросы за несколько месяцев прозрачно подключают нужные файлы, архивы
+распаковываются в кэш по требованию. Резервные копии партиций и архивов
+снимает backup.backup_history вместе с копией основной базы.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from database import DB_PATH, append_event
+
+HISTORY_DIR = 'history'
+# Сколько распакованных архивов держать в кэше
+ARCHIVE_CACHE_LIMIT = 12
+# Ограничение SQLite на число подключённых баз
+MAX_ATTACHED = 10
+
+PARTITION_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS intake (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    drunk_at TEXT NOT NULL,
+    amount_ml INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_intake_chat ON intake (chat_id, drunk_at);
+'''
+
+# Уже созданные файлы партиций (чтобы не выполнять DDL на каждую запись)
+_known_partitions = set()
+
+def partition_name(year, month):
+    return f"intake-{year:04d}-{month:02d}"
+
+def partition_path(year, month, history_dir=HISTORY_DIR):
+    return os.path.join(history_dir, f"{partition_name(year, month)}.db")
+
+def archive_path(year, month, history_dir=HISTORY_DIR):
+    return os.path.join(history_dir, f"{partition_name(year, month)}.db.gz")
+
+def _cache_path(year, month, history_dir=HISTORY_DIR):
+    return os.path.join(history_dir, 'cache', f"{partition_name(year, month)}.db")
+
+def _ensure_partition(year, month, history_dir=HISTORY_DIR):
+    path = partition_path(year, month, history_dir)
+    if path not in _known_partitions:
+        os.makedirs(history_dir, exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.executescript(PARTITION_SCHEMA)
+        conn.close()
+        _known_partitions.add(path)
+    return path
+
+# Запись выпитой воды (вместе с событием в outbox, одной транзакцией)
+def record_intake(chat_id, amount_ml, drunk_at=None, db_path=DB_PATH, history_dir=HISTORY_DIR):
+    drunk_at = drunk_at or datetime.now()
+    path = _ensure_partition(drunk_at.year, drunk_at.month, history_dir)
+    stamp = drunk_at.isoformat(sep=' ', timespec='seconds')
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("ATTACH DATABASE ? AS part", (path,))
+    cursor.execute(
+        "INSERT INTO part.intake (chat_id, drunk_at, amount_ml) VALUES (?, ?, ?)",
+        (chat_id, stamp, amount_ml)
+    )
+    append_event(cursor, 'intake_recorded', chat_id, {'amount_ml': amount_ml, 'drunk_at': stamp})
+    conn.commit()
+    conn.close()
+
+def _months_between(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+# Файл для чтения месяца: горячая партиция или распакованный архив
+def _readable_path(year, month, history_dir=HISTORY_DIR):
+    path = partition_path(year, month, history_dir)
+    if os.path.exists(path):
+        return path
+    archive = archive_path(year, month, history_dir)
+    if not os.path.exists(archive):
+        return None
+    cached = _cache_path(year, month, history_dir)
+    if not os.path.exists(cached):
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        temp_path = f"{cached}.tmp"
+        with gzip.open(archive, 'rb') as source, open(temp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(temp_path, cached)
+        _trim_cache(history_dir)
+    else:
+        # Отмечаем использование для вытеснения старых файлов
+        os.utime(cached)
+    return cached
+
+def _trim_cache(history_dir=HISTORY_DIR):
+    cached = glob.glob(os.path.join(history_dir, 'cache', 'intake-*.db'))
+    cached.sort(key=os.path.getmtime)
+    for path in cached[:-ARCHIVE_CACHE_LIMIT]:
+        os.remove(path)
+
+# Суммы по дням за период [start_date, end_date] включительно: {date: мл}
+def daily_totals(chat_id, start_date, end_date, history_dir=HISTORY_DIR):
+    start = start_date.isoformat()
+    end = (end_date + timedelta(days=1)).isoformat()
+    paths = [
+        path for path in (
+            _readable_path(year, month, history_dir)
+            for year, month in _months_between(start_date, end_date)
+        )
+        if path is not None
+    ]
+
+    totals = {}
+    for offset in range(0, len(paths), MAX_ATTACHED):
+        chunk = paths[offset:offset + MAX_ATTACHED]
+        conn = sqlite3.connect('file::memory:', uri=True)
+        selects = []
+        params = []
+        for number, path in enumerate(chunk):
+            conn.execute("ATTACH DATABASE ? AS ?", (f"file:{os.path.abspath(path)}?mode=ro", f"p{number}"))
+            selects.append(
+                f"SELECT drunk_at, amount_ml FROM p{number}.intake "
+                "WHERE chat_id = ? AND drunk_at >= ? AND drunk_at < ?"
+            )
+            params += [chat_id, start, end]
+        query = (
+            "SELECT substr(drunk_at, 1, 10) AS day, SUM(amount_ml) FROM ("
+            + " UNION ALL ".join(selects)
+            + ") GROUP BY day"
+        )
+        for day, total in conn.execute(query, params):
+            day = date.fromisoformat(day)
+            totals[day] = totals.get(day, 0) + total
+        conn.close()
+    return totals
+
+def total_for_day(chat_id, day, history_dir=HISTORY_DIR):
+    return daily_totals(chat_id, day, day, history_dir).get(day, 0)
+
+# Сжатие закрытых месяцев в архивы только для чтения
+def compact_closed_months(now=None, history_dir=HISTORY_DIR):
+    """Месяц считается закрытым через сутки после окончания (запас на запоздавшие записи)"""
+    now = now or datetime.now()
+    closed_before = (now - timedelta(days=1)).date().replace(day=1)
+    archived = []
+    for path in sorted(glob.glob(os.path.join(history_dir, 'intake-*.db'))):
+        year, month = map(int, os.path.basename(path)[len('intake-'):-len('.db')].split('-'))
+        if date(year, month, 1) >= closed_before:
+            continue
+        archive = archive_path(year, month, history_dir)
+        compacted = f"{path}.vacuum"
+        if os.path.exists(compacted):
+            os.remove(compacted)
+
+        conn = sqlite3.connect(path)
+        conn.execute("VACUUM INTO ?", (compacted,))
+        conn.close()
+
+        temp_archive = f"{archive}.tmp"
+        if os.path.exists(temp_archive):
+            os.remove(temp_archive)
+        with open(compacted, 'rb') as source, gzip.open(temp_archive, 'wb', compresslevel=9) as target:
+            shutil.copyfileobj(source, target)
+        os.chmod(temp_archive, 0o444)
+        os.replace(temp_archive, archive)
+        os.remove(compacted)
+        os.remove(path)
+        _known_partitions.discard(path)
+        archived.append(archive)
+    return archived
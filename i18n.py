@@ -0,0 +1,237 @@
+"""Каталоги сообщений на разных языках.
+
+Тексты лежат в locales/<язык>.txt: блок начинается строкой `@ключ`,
+дальше идёт текст сообщения (строки с # в начале - комментарии).
+Подстановки пишутся как {имя}, фигурные скобки в тексте - {{ и }}.
+
+Каталог заранее компилируется в locales/<язык>.cat: шаблоны уже разбиты
+на статические части и имена подстановок, поэтому форматирование - это
+только склейка строк, а сообщения без подстановок отдаются как есть.
+Язык загружается при первом пользователе с таким language_code; ключи,
+которых нет в переводе, берутся из каталога по умолчанию. Если .cat нет,
+он устарел или повреждён, каталог собирается заново; когда locales только
+для чтения (образ контейнера), собранный каталог остаётся в памяти -
+чтобы этого избежать, компилируйте каталоги при сборке образа.
+
+Примеры:
+    python i18n.py compile
+    python i18n.py check
+"""
+import argparse
+import logging
+import marshal
+import os
+import re
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+DEFAULT_LOCALE = 'ru'
+
+CATALOG_MAGIC = b'WTI18N1\n'
+
+# Подстановка {имя} или экранированная скобка
+_TOKEN = re.compile(r'\{\{|\}\}|\{([a-z_][a-z0-9_]*)\}')
+
+def source_path(locale, locales_dir=LOCALES_DIR):
+    return os.path.join(locales_dir, f"{locale}.txt")
+
+def compiled_path(locale, locales_dir=LOCALES_DIR):
+    return os.path.join(locales_dir, f"{locale}.cat")
+
+# Разбор исходного файла: {ключ: текст}
+def parse_source(path):
+    messages = {}
+    key = None
+    lines = []
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            line = line.rstrip('\n')
+            if line.startswith('#'):
+                continue
+            if line.startswith('@'):
+                if key is not None:
+                    messages[key] = '\n'.join(lines).strip('\n')
+                key = line[1:].strip()
+                if key in messages:
+                    raise ValueError(f"{path}:{number}: ключ {key} повторяется")
+                lines = []
+            elif key is not None:
+                lines.append(line)
+            elif line.strip():
+                raise ValueError(f"{path}:{number}: текст до первого ключа")
+    if key is not None:
+        messages[key] = '\n'.join(lines).strip('\n')
+    return messages
+
+# Разбиение шаблона: строка без подстановок или (статика, имя, статика, ..., статика)
+def split_template(text, key=''):
+    parts = []
+    static = []
+    position = 0
+    for match in _TOKEN.finditer(text):
+        static.append(text[position:match.start()])
+        if match.group(1) is None:
+            static.append(match.group()[0])
+        else:
+            parts.append(''.join(static))
+            parts.append(match.group(1))
+            static = []
+        position = match.end()
+    static.append(text[position:])
+    if any('{' in chunk or '}' in chunk for chunk in static):
+        raise ValueError(f"Неверная подстановка в сообщении {key}")
+    if not parts:
+        return ''.join(static)
+    parts.append(''.join(static))
+    return tuple(parts)
+
+def placeholders(template):
+    return set() if isinstance(template, str) else set(template[1::2])
+
+def _compile_source(locale, locales_dir=LOCALES_DIR):
+    messages = parse_source(source_path(locale, locales_dir))
+    return {key: split_template(text, key) for key, text in messages.items()}
+
+# Компиляция исходного файла языка в locales/<язык>.cat
+def compile_locale(locale, locales_dir=LOCALES_DIR):
+    compiled = _compile_source(locale, locales_dir)
+    path = compiled_path(locale, locales_dir)
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(CATALOG_MAGIC)
+            file.write(marshal.dumps(compiled))
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return compiled
+
+# Пересборка при загрузке: если записать .cat нельзя, каталог остаётся в памяти
+def _recompile(locale, locales_dir=LOCALES_DIR):
+    try:
+        return compile_locale(locale, locales_dir)
+    except OSError as e:
+        logging.warning("Каталог %s не сохранён (%s), используется собранный в памяти", locale, e)
+        return _compile_source(locale, locales_dir)
+
+def _load_compiled(locale, locales_dir=LOCALES_DIR):
+    path = compiled_path(locale, locales_dir)
+    source = source_path(locale, locales_dir)
+    # Каталог пересобирается, если его нет, исходник новее или файл повреждён
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+        return _recompile(locale, locales_dir)
+    with open(path, 'rb') as file:
+        data = file.read()
+    if not data.startswith(CATALOG_MAGIC):
+        return _recompile(locale, locales_dir)
+    try:
+        compiled = marshal.loads(data[len(CATALOG_MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return _recompile(locale, locales_dir)
+    if not isinstance(compiled, dict):
+        return _recompile(locale, locales_dir)
+    return compiled
+
+class Catalog:
+    def __init__(self, locale, messages, fallback=None):
+        self.locale = locale
+        self._messages = messages
+        self._fallback = fallback
+
+    def __contains__(self, key):
+        return key in self._messages or (self._fallback is not None and key in self._fallback)
+
+    # Сообщение по ключу с подстановкой значений
+    def format(self, key, **values):
+        template = self._messages.get(key)
+        if template is None:
+            if self._fallback is None:
+                raise KeyError(f"Нет сообщения {key} ({self.locale})")
+            return self._fallback.format(key, **values)
+        if template.__class__ is str:
+            return template
+        parts = list(template)
+        for position in range(1, len(parts), 2):
+            parts[position] = str(values[parts[position]])
+        return ''.join(parts)
+
+# Загруженные каталоги: язык -> Catalog и language_code -> Catalog
+_catalogs = {}
+_by_code = {}
+_available = None
+
+def list_locales(locales_dir=LOCALES_DIR):
+    return frozenset(name[:-len('.txt')] for name in os.listdir(locales_dir) if name.endswith('.txt'))
+
+def available_locales():
+    global _available
+    if _available is None:
+        _available = list_locales()
+    return _available
+
+# Язык каталога для language_code из Telegram ('en-US' -> 'en')
+def resolve_locale(language_code):
+    if not language_code:
+        return DEFAULT_LOCALE
+    locale = language_code.replace('_', '-').split('-')[0].lower()
+    return locale if locale in available_locales() else DEFAULT_LOCALE
+
+def _get_locale(locale):
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        fallback = None if locale == DEFAULT_LOCALE else _get_locale(DEFAULT_LOCALE)
+        catalog = Catalog(locale, _load_compiled(locale), fallback)
+        _catalogs[locale] = catalog
+    return catalog
+
+# Каталог для пользователя (язык загружается при первом обращении)
+def get_catalog(language_code=None):
+    catalog = _by_code.get(language_code)
+    if catalog is None:
+        catalog = _get_locale(resolve_locale(language_code))
+        _by_code[language_code] = catalog
+    return catalog
+
+# Сверка переводов с каталогом по умолчанию: [(язык, описание проблемы)]
+def check_locales(locales_dir=LOCALES_DIR):
+    problems = []
+    base = {
+        key: split_template(text, key)
+        for key, text in parse_source(source_path(DEFAULT_LOCALE, locales_dir)).items()
+    }
+    for locale in sorted(list_locales(locales_dir) - {DEFAULT_LOCALE}):
+        messages = parse_source(source_path(locale, locales_dir))
+        for key in sorted(set(base) - set(messages)):
+            problems.append((locale, f"нет перевода {key}"))
+        for key in sorted(set(messages) - set(base)):
+            problems.append((locale, f"лишний ключ {key}"))
+        for key in sorted(set(base) & set(messages)):
+            if placeholders(split_template(messages[key], key)) != placeholders(base[key]):
+                problems.append((locale, f"подстановки в {key} не совпадают"))
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Каталоги сообщений")
+    parser.add_argument('--dir', default=LOCALES_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_command = commands.add_parser('compile', help="скомпилировать каталоги")
+    compile_command.add_argument('locales', nargs='*')
+    commands.add_parser('check', help="сверить переводы с каталогом по умолчанию")
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        for locale in args.locales or sorted(list_locales(args.dir)):
+            messages = compile_locale(locale, args.dir)
+            print(f"{compiled_path(locale, args.dir)}: {len(messages)} сообщений")
+        return
+
+    problems = check_locales(args.dir)
+    for locale, problem in problems:
+        print(f"{locale}: {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("Переводы совпадают с каталогом по умолчанию")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,22 @@
+import asyncio
+import os
+import signal
 import sqlite3
 import re
 import logging
-from datetime import time
+import threading
+from datetime import date, time, timedelta
+from time import monotonic
 from telegram import (
     Update, 
     InlineKeyboardButton, 
     InlineKeyboardMarkup, 
     ReplyKeyboardRemove
 )
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application, 
+    ApplicationHandlerStop,
     CommandHandler, 
     ContextTypes, 
     ConversationHandler,
@@ -17,12 +24,70 @@ from telegram.ext import (
     filters, 
     CallbackQueryHandler
 )
+from telegram.request import HTTPXRequest
+from database import (
+    init_db,
+    get_user,
+    save_user,
+    update_user,
+    iter_schedule_rows,
+    iter_language_codes,
+    get_profile_version,
+    get_watermark,
+    set_watermark,
+    save_pending_reminders,
+    take_pending_reminders
+)
+from backup import backup_history, create_backup
+from challenges import Challenges, adherence_score
+from catchup import CatchupQueue, catchup_range, missed_reminders, plan_catchup
+from config import CONFIG
+from gazetteer import get_index as get_city_index
+from i18n import DEFAULT_LOCALE, get_catalog, resolve_locale
+from health import Lifecycle, start_health_server
+from history import record_intake, daily_totals, compact_closed_months
+from outbox import compact as compact_outbox
+from profiling import begin_session, end_session, profile_for, report_filename
+from ratelimit import OutboundLimiter
+from scheduler import ReminderScheduler, GLASS_SIZE_ML, water_norm_liters, reminder_count
+from tenants import load_tenants, prepare_tenant
+from throttle import ChatThrottle
 
 # Настройка логирования
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+# httpx пишет в INFO адрес каждого запроса, а в нём токен бота
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Администраторы бота (настройка admin_chat_ids)
+ADMIN_CHAT_IDS = CONFIG.admin_chat_ids
+
+# Период снимка расписания для быстрого перезапуска, сек
+SCHEDULE_SNAPSHOT_INTERVAL = 10 * 60
+
+# Соединений с Telegram на все боты процесса (кроме getUpdates)
+CONNECTION_POOL_SIZE = 256
+
+# Ограничения объёма для /drink, мл
+DRINK_MIN_ML = 50
+DRINK_MAX_ML = 2000
+# Период сжатия закрытых месяцев истории, сек
+HISTORY_COMPACT_INTERVAL = 24 * 60 * 60
+
+# Период сжатия outbox (удаление подтверждённых событий), сек
+OUTBOX_COMPACT_INTERVAL = 60 * 60
+
+# Период резервного копирования базы, сек
+BACKUP_INTERVAL = 24 * 60 * 60
+
+# Пауза перед повторной загрузкой расписания после ошибки, сек
+WARM_UP_RETRY_INTERVAL = 30
+
+# Ограничения длительности профилирования, сек
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
 
 # ЧЁТКИЕ СОСТОЯНИЯ ДЛЯ КАЖДОГО ШАГА
 (
@@ -39,89 +104,110 @@ logging.basicConfig(
     AWAITING_CITY_INPUT
 ) = range(11)
 
-# Инициализация базы данных
-def init_db():
-    conn = sqlite3.connect('water_tracker.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        chat_id INTEGER PRIMARY KEY,
-        first_name TEXT NOT NULL,
-        weight REAL NOT NULL,
-        height REAL NOT NULL,
-        gender TEXT NOT NULL,
-        activity_level TEXT NOT NULL,
-        start_time TEXT NOT NULL DEFAULT '08:00',
-        end_time TEXT NOT NULL DEFAULT '22:00',
-        city TEXT
-    )
-    ''')
-    conn.commit()
-    conn.close()
+# СОСТОЯНИЯ ДЛЯ НАСТРОЕК ПРОФИЛЯ
+(
+    SETTINGS_MENU,
+    SETTINGS_WEIGHT_INPUT,
+    SETTINGS_ACTIVITY,
+    SETTINGS_START_TIME_INPUT,
+    SETTINGS_END_TIME_INPUT,
+    SETTINGS_CITY_INPUT
+) = range(11, 17)
 
-# Получение данных пользователя
-def get_user(chat_id):
-    conn = sqlite3.connect('water_tracker.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE chat_id = ?", (chat_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
-
-# Сохранение данных пользователя
-def save_user(chat_id, first_name, weight, height, gender, activity, start_time='08:00', end_time='22:00', city=None):
-    conn = sqlite3.connect('water_tracker.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    INSERT OR REPLACE INTO users 
-    (chat_id, first_name, weight, height, gender, activity_level, start_time, end_time, city)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (chat_id, first_name, weight, height, gender, activity, start_time, end_time, city))
-    conn.commit()
-    conn.close()
+# Значения пола и активности в базе -> ключи каталога сообщений
+GENDER_CODES = {'мужской': 'male', 'женский': 'female'}
+ACTIVITY_CODES = {'низкий': 'low', 'средний': 'medium', 'высокий': 'high'}
+
+# Бот, получивший обновление: пути к его данным (см. tenants.py)
+def get_tenant(context):
+    return context.application.bot_data['tenant']
+
+# Каталог сообщений на языке пользователя
+def get_texts(update: Update):
+    return get_catalog(update.effective_user.language_code)
+
+# Ограничение частоты сообщений из личного чата (до всех остальных обработчиков)
+async def throttle_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    allowed, cooldown = context.application.bot_data['throttle'].check(update.effective_chat.id)
+    if allowed:
+        return
+    if cooldown is not None:
+        await update.effective_message.reply_text(get_texts(update).format('throttle.slow_down', seconds=cooldown))
+    raise ApplicationHandlerStop
+
+# Ответ на неверный ввод: ошибки подряд получают один ответ за паузу
+async def reply_invalid_input(update: Update, context: ContextTypes.DEFAULT_TYPE, text, reply_markup=None):
+    if context.application.bot_data['throttle'].invalid_input(update.effective_chat.id):
+        await update.message.reply_text(
+            text,
+            parse_mode='Markdown',
+            reply_markup=reply_markup or ReplyKeyboardRemove()
+        )
+
+def accept_input(context: ContextTypes.DEFAULT_TYPE, chat_id):
+    context.application.bot_data['throttle'].valid_input(chat_id)
+
+# Пол и уровень активности на языке пользователя
+def gender_label(t, gender):
+    code = GENDER_CODES.get(gender)
+    return t.format(f'gender.{code}') if code else gender
+
+def activity_label(t, activity):
+    code = ACTIVITY_CODES.get(activity)
+    return t.format(f'activity.{code}') if code else activity
 
 # Создание инлайн-клавиатуры для пола
-def get_gender_keyboard():
+def get_gender_keyboard(t):
     keyboard = [
         [
-            InlineKeyboardButton("🙋‍♂️ Мужской", callback_data='gender_male'),
-            InlineKeyboardButton("🙋‍♀️ Женский", callback_data='gender_female')
+            InlineKeyboardButton(t.format('button.gender_male'), callback_data='gender_male'),
+            InlineKeyboardButton(t.format('button.gender_female'), callback_data='gender_female')
         ],
-        [InlineKeyboardButton("🔙 Вернуться к весу", callback_data='back_to_weight')]
+        [InlineKeyboardButton(t.format('button.back_to_weight'), callback_data='back_to_weight')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
 # Создание инлайн-клавиатуры для активности
-def get_activity_keyboard():
+def get_activity_keyboard(t):
     keyboard = [
         [
-            InlineKeyboardButton("🚶‍♂️ Низкий", callback_data='activity_low'),
-            InlineKeyboardButton("🏃‍♀️ Средний", callback_data='activity_medium'),
-            InlineKeyboardButton("🏋️‍♂️ Высокий", callback_data='activity_high')
+            InlineKeyboardButton(t.format('button.activity_low'), callback_data='activity_low'),
+            InlineKeyboardButton(t.format('button.activity_medium'), callback_data='activity_medium'),
+            InlineKeyboardButton(t.format('button.activity_high'), callback_data='activity_high')
         ],
-        [InlineKeyboardButton("🔙 Вернуться к полу", callback_data='back_to_gender')]
+        [InlineKeyboardButton(t.format('button.back_to_gender'), callback_data='back_to_gender')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
 # Создание инлайн-клавиатуры для времени уведомлений
-def get_notification_time_keyboard():
+def get_notification_time_keyboard(t):
     keyboard = [
         [
-            InlineKeyboardButton("🕗 Стандартное время (08:00-22:00)", callback_data='time_standard'),
-            InlineKeyboardButton("⏰ Указать своё время", callback_data='time_custom')
+            InlineKeyboardButton(t.format('button.time_standard'), callback_data='time_standard'),
+            InlineKeyboardButton(t.format('button.time_custom'), callback_data='time_custom')
         ],
-        [InlineKeyboardButton("🔙 Вернуться к активности", callback_data='back_to_activity')]
+        [InlineKeyboardButton(t.format('button.back_to_activity'), callback_data='back_to_activity')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
 # Создание инлайн-клавиатуры для города
-def get_city_keyboard():
+def get_city_keyboard(t):
     keyboard = [
-        [InlineKeyboardButton("⏭️ Пропустить этот шаг", callback_data='skip_city')],
-        [InlineKeyboardButton("🔙 Вернуться к времени уведомлений", callback_data='back_to_time')]
+        [InlineKeyboardButton(t.format('button.skip_city'), callback_data='skip_city')],
+        [InlineKeyboardButton(t.format('button.back_to_time'), callback_data='back_to_time')]
     ]
     return InlineKeyboardMarkup(keyboard)
 
+# Создание инлайн-клавиатуры с вариантами города из справочника
+def get_city_suggestions_keyboard(t, cities):
+    keyboard = [
+        [InlineKeyboardButton(t.format('button.city', city=city.name), callback_data=f'city_{city.id}')]
+        for city in cities
+    ]
+    keyboard.append([InlineKeyboardButton(t.format('button.keep_city_input'), callback_data='keep_city_input')])
+    keyboard.append([InlineKeyboardButton(t.format('button.skip_city'), callback_data='skip_city')])
+    return InlineKeyboardMarkup(keyboard)
+
 # Валидация времени
 def validate_time(time_str):
     if not re.match(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$', time_str):
@@ -133,17 +219,59 @@ def validate_time(time_str):
     except ValueError:
         return False
 
+# Приведение времени к виду ЧЧ:ММ ('8:00' -> '08:00')
+def format_time(time_str):
+    hours, minutes = map(int, time_str.split(':'))
+    return f"{hours:02d}:{minutes:02d}"
+
+# Проверки времени; текст ValueError - ключ сообщения в каталоге
+def check_start_time(time_str):
+    hours, minutes = map(int, time_str.split(':'))
+    start_time = time(hours, minutes)
+    
+    # Минимальное время - 06:00
+    if start_time < time(6, 0):
+        raise ValueError("error.too_early")
+
+# Проверка диапазона уведомлений
+def check_time_window(start_time_str, end_time_str):
+    hours, minutes = map(int, end_time_str.split(':'))
+    end_time = time(hours, minutes)
+    start_hours, start_minutes = map(int, start_time_str.split(':'))
+    start_time = time(start_hours, start_minutes)
+    
+    # Максимальное время - 23:59
+    if end_time > time(23, 59):
+        raise ValueError("error.too_late")
+    
+    # Проверка минимального диапазона (4 часа)
+    time_diff = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    if time_diff < 240:  # 4 часа = 240 минут
+        raise ValueError("error.window_too_short")
+    
+    # Проверка, что время окончания позже начала
+    if end_time <= start_time:
+        raise ValueError("error.end_before_start")
+
 # Команда /start - ТОЧКА ВХОДА
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db_user = get_user(user.id)
+    db_path = get_tenant(context).db_path
+    db_user = get_user(user.id, db_path)
     
     if db_user:
+        # Язык напоминаний следует за языком клиента Telegram
+        if db_user[10] != user.language_code:
+            update_user(user.id, db_path, language_code=user.language_code)
+            remember_language(context, user.id, user.language_code)
         await update.message.reply_text(
-            f"👋 Здравствуйте, {user.first_name}! Рад вас видеть! 💧\n\n"
-            f"Надеюсь, вы не забываете пить водичку! 😊\n"
-            f"Ваша норма на сегодня: *{calculate_water_norm(db_user)}* литров 💦\n"
-            f"⏰ Уведомления: с {db_user[6]} до {db_user[7]}",
+            get_texts(update).format(
+                'start.welcome_back',
+                name=user.first_name,
+                norm=calculate_water_norm(db_user),
+                start=db_user[6],
+                end=db_user[7]
+            ),
             parse_mode='Markdown',
             reply_markup=ReplyKeyboardRemove()
         )
@@ -160,37 +288,20 @@ def calculate_water_norm(user_data):
     weight = user_data[2]  # вес из БД
     activity_level = user_data[5]  # уровень активности
     
-    # Базовый расчёт: 30 мл на 1 кг веса
-    base_norm = weight * 0.03
-    
-    # Коэффициенты для активности
-    activity_coefficients = {
-        'низкий': 1.0,
-        'средний': 1.2,
-        'высокий': 1.5
-    }
-    
-    final_norm = base_norm * activity_coefficients.get(activity_level.lower(), 1.0)
+    final_norm = water_norm_liters(weight, activity_level)
     return f"{final_norm:.1f}"
 
 # ШАГ 1: ЗАПРОС ВЕСА
 async def ask_weight(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Переключение на состояние запроса веса"""
+    t = get_texts(update)
     if update.message:
         await update.message.reply_text(
-            f"👋 Привет! Я - ваш персональный помощник по питью воды! 💧\n\n"
-            f"Чтобы правильно рассчитать вашу дневную норму воды, мне нужна немного информации.\n"
-            f"Все данные защищены и используются только для расчётов! 🔒",
+            t.format('register.intro'),
             reply_markup=ReplyKeyboardRemove()
         )
     
-    message_text = (
-        "⚖️ *ШАГ 1 ИЗ 6: ВЕС*\n\n"
-        "Пожалуйста, введите ваш вес в килограммах (примеры: 65 или 72.5)\n\n"
-        "💡 *Зачем это нужно?*\n"
-        "От веса напрямую зависит количество воды, которое вам нужно пить. "
-        "Чем больше вес - тем больше воды требуется вашему организму! 💪"
-    )
+    message_text = t.format('register.weight')
     
     if update.callback_query:
         await update.callback_query.answer()
@@ -215,39 +326,17 @@ async def handle_weight_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Валидация веса
     if not re.match(r'^\d+(\.\d{1,2})?$', text):
-        await update.message.reply_text(
-            "❌ *ОШИБКА ВВОДА!*\n\n"
-            "Пожалуйста, введите вес в правильном формате:\n"
-            "• Целое число: `65`\n"
-            "• Десятичная дробь: `65.5`\n\n"
-            "⚖️ *Примеры правильного ввода:*\n"
-            "✅ 50\n"
-            "✅ 55.5\n"
-            "✅ 120\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, get_texts(update).format('register.weight_format_error'))
         return AWAITING_WEIGHT_INPUT
     
     weight_value = float(text)
     
     if weight_value < 30 or weight_value > 300:
-        await update.message.reply_text(
-            "⚠️ *НЕРЕАЛИСТИЧНЫЙ ВЕС!*\n\n"
-            "Диапазон допустимых значений:\n"
-            "• Минимум: 30 кг\n"
-            "• Максимум: 300 кг\n\n"
-            "⚖️ *Примеры правильного ввода:*\n"
-            "✅ 65\n"
-            "✅ 72.5\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, get_texts(update).format('register.weight_range_error'))
         return AWAITING_WEIGHT_INPUT
     
     context.user_data['weight'] = weight_value
+    accept_input(context, update.effective_chat.id)
     
     # Переход к следующему шагу
     return await ask_height(update, context)
@@ -255,17 +344,8 @@ async def handle_weight_input(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ШАГ 2: ЗАПРОС РОСТА
 async def ask_height(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Переключение на состояние запроса роста"""
-    message_text = (
-        "✅ *Вес успешно сохранён!*\n\n"
-        "📏 *ШАГ 2 ИЗ 6: РОСТ*\n\n"
-        "Введите ваш рост в сантиметрах (примеры: 175 или 168.5)\n\n"
-        "💡 *Зачем это нужно?*\n"
-        "Рост помогает точнее рассчитать вашу норму воды, "
-        "особенно в сочетании с весом и уровнем активности! 📐"
-    )
-    
     await update.message.reply_text(
-        message_text,
+        get_texts(update).format('register.height'),
         parse_mode='Markdown',
         reply_markup=ReplyKeyboardRemove()
     )
@@ -279,39 +359,17 @@ async def handle_height_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Валидация роста
     if not re.match(r'^\d+(\.\d{1,2})?$', text):
-        await update.message.reply_text(
-            "❌ *ОШИБКА ВВОДА!*\n\n"
-            "Пожалуйста, введите рост в правильном формате:\n"
-            "• Целое число: `175`\n"
-            "• Десятичная дробь: `168.5`\n\n"
-            "📏 *Примеры правильного ввода:*\n"
-            "✅ 160\n"
-            "✅ 175.5\n"
-            "✅ 200\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, get_texts(update).format('register.height_format_error'))
         return AWAITING_HEIGHT_INPUT
     
     height_value = float(text)
     
     if height_value < 100 or height_value > 250:
-        await update.message.reply_text(
-            "⚠️ *НЕРЕАЛИСТИЧНЫЙ РОСТ!*\n\n"
-            "Диапазон допустимых значений:\n"
-            "• Минимум: 100 см\n"
-            "• Максимум: 250 см\n\n"
-            "📏 *Примеры правильного ввода:*\n"
-            "✅ 165\n"
-            "✅ 180.5\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, get_texts(update).format('register.height_range_error'))
         return AWAITING_HEIGHT_INPUT
     
     context.user_data['height'] = height_value
+    accept_input(context, update.effective_chat.id)
     
     # Переход к следующему шагу
     return await ask_gender(update, context)
@@ -319,19 +377,11 @@ async def handle_height_input(update: Update, context: ContextTypes.DEFAULT_TYPE
 # ШАГ 3: ЗАПРОС ПОЛА
 async def ask_gender(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Переключение на состояние запроса пола"""
-    message_text = (
-        "✅ *Рост успешно сохранён!*\n\n"
-        "👤 *ШАГ 3 ИЗ 6: ПОЛ*\n\n"
-        "Выберите ваш пол, нажав на кнопку ниже 👇\n\n"
-        "💡 *Зачем это нужно?*\n"
-        "Пол влияет на расчёт базовой нормы воды из-за различий в физиологии. "
-        "Это поможет мне дать вам более точные рекомендации! 🔍"
-    )
-    
+    t = get_texts(update)
     await update.message.reply_text(
-        message_text,
+        t.format('register.gender'),
         parse_mode='Markdown',
-        reply_markup=get_gender_keyboard()
+        reply_markup=get_gender_keyboard(t)
     )
     
     return ASKING_GENDER
@@ -343,6 +393,7 @@ async def handle_gender_choice(update: Update, context: ContextTypes.DEFAULT_TYP
     await query.answer()
     
     callback_data = query.data
+    t = get_texts(update)
     
     # Обработка возврата к предыдущему шагу
     if callback_data == 'back_to_weight':
@@ -350,10 +401,9 @@ async def handle_gender_choice(update: Update, context: ContextTypes.DEFAULT_TYP
     
     if callback_data not in ['gender_male', 'gender_female']:
         await query.edit_message_text(
-            "❌ *НЕВЕРНЫЙ ВЫБОР!*\n\n"
-            "Пожалуйста, выберите пол, нажав на одну из кнопок ниже:",
+            t.format('register.gender_invalid'),
             parse_mode='Markdown',
-            reply_markup=get_gender_keyboard()
+            reply_markup=get_gender_keyboard(t)
         )
         return ASKING_GENDER
     
@@ -366,14 +416,9 @@ async def handle_gender_choice(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Подтверждение выбора и переход к следующему шагу
     await query.edit_message_text(
-        f"✅ *Пол успешно выбран: {context.user_data['gender'].capitalize()}*\n\n"
-        "🏋️‍♂️ *ШАГ 4 ИЗ 6: УРОВЕНЬ АКТИВНОСТИ*\n\n"
-        "Выберите ваш уровень физической активности 👇\n\n"
-        "💡 *Зачем это нужно?*\n"
-        "Чем активнее вы занимаетесь спортом или работаете, тем больше воды "
-        "вам нужно пить для восполнения потерь! 💦",
+        t.format('register.activity', gender=gender_label(t, context.user_data['gender']).capitalize()),
         parse_mode='Markdown',
-        reply_markup=get_activity_keyboard()
+        reply_markup=get_activity_keyboard(t)
     )
     
     return ASKING_ACTIVITY
@@ -384,6 +429,7 @@ async def handle_activity_choice(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     callback_data = query.data
+    t = get_texts(update)
     
     # Обработка возврата к предыдущим шагам
     if callback_data == 'back_to_gender':
@@ -391,10 +437,9 @@ async def handle_activity_choice(update: Update, context: ContextTypes.DEFAULT_T
     
     if callback_data not in ['activity_low', 'activity_medium', 'activity_high']:
         await query.edit_message_text(
-            "❌ *НЕВЕРНЫЙ ВЫБОР!*\n\n"
-            "Пожалуйста, выберите уровень активности, нажав на одну из кнопок ниже:",
+            t.format('register.activity_invalid'),
             parse_mode='Markdown',
-            reply_markup=get_activity_keyboard()
+            reply_markup=get_activity_keyboard(t)
         )
         return ASKING_ACTIVITY
     
@@ -408,15 +453,9 @@ async def handle_activity_choice(update: Update, context: ContextTypes.DEFAULT_T
     
     # Подтверждение выбора и переход к следующему шагу
     await query.edit_message_text(
-        f"✅ *Уровень активности успешно выбран: {context.user_data['activity'].capitalize()}*\n\n"
-        "⏰ *ШАГ 5 ИЗ 6: ВРЕМЯ УВЕДОМЛЕНИЙ*\n\n"
-        "Когда вам удобно получать напоминания о питье воды? 💧\n\n"
-        "💡 *Зачем это нужно?*\n"
-        "Я рассчитаю оптимальное количество напоминаний в течение дня, "
-        "учитывая вашу норму воды и выбранный временной диапазон. "
-        "Каждое напоминание будет предлагать выпить примерно стакан воды (250 мл)! 🥤",
+        t.format('register.notification_time', activity=activity_label(t, context.user_data['activity']).capitalize()),
         parse_mode='Markdown',
-        reply_markup=get_notification_time_keyboard()
+        reply_markup=get_notification_time_keyboard(t)
     )
     
     return ASKING_NOTIFICATION_TIME
@@ -428,6 +467,7 @@ async def handle_notification_time_choice(update: Update, context: ContextTypes.
     await query.answer()
     
     callback_data = query.data
+    t = get_texts(update)
     
     # Обработка возврата к предыдущему шагу
     if callback_data == 'back_to_activity':
@@ -439,18 +479,9 @@ async def handle_notification_time_choice(update: Update, context: ContextTypes.
         context.user_data['end_time'] = '22:00'
         
         await query.edit_message_text(
-            "✅ *Стандартное время выбрано!*\n\n"
-            "🕗 Уведомления будут приходить с 08:00 до 22:00\n\n"
-            "🏙️ *ШАГ 6 ИЗ 6: ГОРОД*\n\n"
-            "Теперь укажите ваш город (примеры: Москва или New York)\n\n"
-            "💡 *Зачем это нужно?* (необязательно)\n"
-            "Если вы укажете город, каждое утро я буду присылать вам:\n"
-            "• Прогноз погоды на день ☀️🌧️\n"
-            "• Персонализированную рекомендацию по потреблению воды\n"
-            "• Напоминания с учётом погодных условий\n\n"
-            "👉 Если хотите пропустить этот шаг, нажмите кнопку ниже:",
+            t.format('register.standard_time_set') + "\n\n" + t.format('register.city'),
             parse_mode='Markdown',
-            reply_markup=get_city_keyboard()
+            reply_markup=get_city_keyboard(t)
         )
         return ASKING_CITY
     
@@ -461,11 +492,7 @@ async def handle_notification_time_choice(update: Update, context: ContextTypes.
         
         # Отправляем сообщение о вводе времени начала
         await query.message.reply_text(
-            "⏰ *УКАЖИТЕ СВОЁ ВРЕМЯ*\n\n"
-            "🕗 С какого времени начинать присылать уведомления?\n"
-            "Введите время в формате ЧЧ:ММ (пример: 09:30)\n\n"
-            "💡 Минимальное время: 06:00\n"
-            "Диапазон для уведомлений должен быть не менее 4 часов!",
+            t.format('register.custom_time'),
             parse_mode='Markdown',
             reply_markup=ReplyKeyboardRemove()
         )
@@ -477,10 +504,9 @@ async def handle_notification_time_choice(update: Update, context: ContextTypes.
     
     else:
         await query.edit_message_text(
-            "❌ *НЕВЕРНЫЙ ВЫБОР!*\n\n"
-            "Пожалуйста, выберите вариант времени из кнопок ниже:",
+            t.format('register.time_invalid'),
             parse_mode='Markdown',
-            reply_markup=get_notification_time_keyboard()
+            reply_markup=get_notification_time_keyboard(t)
         )
         return ASKING_NOTIFICATION_TIME
 
@@ -488,133 +514,72 @@ async def handle_notification_time_choice(update: Update, context: ContextTypes.
 async def handle_start_time_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Валидация и обработка ввода времени начала"""
     time_str = update.message.text.strip()
+    t = get_texts(update)
     
     if not validate_time(time_str):
-        await update.message.reply_text(
-            "❌ *НЕВЕРНЫЙ ФОРМАТ ВРЕМЕНИ!*\n\n"
-            "Пожалуйста, введите время в формате ЧЧ:ММ\n\n"
-            "🕗 *Примеры правильного ввода:*\n"
-            "✅ 08:00\n"
-            "✅ 09:30\n"
-            "✅ 12:45\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, t.format('register.start_time_format_error'))
         return AWAITING_START_TIME_INPUT
     
+    time_str = format_time(time_str)
+    
     try:
-        hours, minutes = map(int, time_str.split(':'))
-        start_time = time(hours, minutes)
-        
-        # Минимальное время - 06:00
-        if start_time < time(6, 0):
-            raise ValueError("Слишком раннее время (минимум 06:00)")
+        check_start_time(time_str)
         
         context.user_data['start_time'] = time_str
+        accept_input(context, update.effective_chat.id)
         
         # Переход к состоянию ожидания времени окончания
         context.user_data['current_state'] = AWAITING_END_TIME_INPUT
         
         # Запрос времени окончания
         await update.message.reply_text(
-            f"✅ *Время начала: {time_str}*\n\n"
-            "🕕 До какого времени присылать уведомления?\n"
-            "Введите время в формате ЧЧ:ММ (пример: 21:00)\n\n"
-            "💡 Максимальное время: 23:59\n"
-            "Разница между началом и окончанием должна быть не менее 4 часов!",
+            t.format('register.end_time', start=time_str),
             parse_mode='Markdown',
             reply_markup=ReplyKeyboardRemove()
         )
         return AWAITING_END_TIME_INPUT
         
-    except Exception as e:
-        await update.message.reply_text(
-            f"❌ *ОШИБКА: {str(e)}*\n\n"
-            "🕗 Пожалуйста, введите корректное время начала:\n"
-            "• Минимум: 06:00\n"
-            "• Формат: ЧЧ:ММ\n\n"
-            "🕗 *Примеры правильного ввода:*\n"
-            "✅ 08:00\n"
-            "✅ 09:30\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+    except ValueError as e:
+        await reply_invalid_input(update, context, t.format('register.start_time_error', error=t.format(str(e))))
         return AWAITING_START_TIME_INPUT
 
 # ОБРАБОТКА ВВОДА ВРЕМЕНИ ОКОНЧАНИЯ
 async def handle_end_time_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Валидация и обработка ввода времени окончания"""
     time_str = update.message.text.strip()
+    t = get_texts(update)
     
     if not validate_time(time_str):
-        await update.message.reply_text(
-            "❌ *НЕВЕРНЫЙ ФОРМАТ ВРЕМЕНИ!*\n\n"
-            "Пожалуйста, введите время в формате ЧЧ:ММ\n\n"
-            "🕕 *Примеры правильного ввода:*\n"
-            "✅ 21:00\n"
-            "✅ 22:30\n"
-            "✅ 23:45\n\n"
-            "Попробуйте ещё раз:",
-            parse_mode='Markdown',
-            reply_markup=ReplyKeyboardRemove()
-        )
+        await reply_invalid_input(update, context, t.format('register.end_time_format_error'))
         return AWAITING_END_TIME_INPUT
     
+    time_str = format_time(time_str)
+    
     try:
-        hours, minutes = map(int, time_str.split(':'))
-        end_time = time(hours, minutes)
-        start_time_str = context.user_data['start_time']
-        start_hours, start_minutes = map(int, start_time_str.split(':'))
-        start_time = time(start_hours, start_minutes)
-        
-        # Максимальное время - 23:59
-        if end_time > time(23, 59):
-            raise ValueError("Слишком позднее время (максимум 23:59)")
-        
-        # Проверка минимального диапазона (4 часа)
-        time_diff = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
-        if time_diff < 240:  # 4 часа = 240 минут
-            raise ValueError("Диапазон времени должен быть не менее 4 часов")
-        
-        # Проверка, что время окончания позже начала
-        if end_time <= start_time:
-            raise ValueError("Время окончания должно быть позже времени начала")
+        check_time_window(context.user_data['start_time'], time_str)
         
         context.user_data['end_time'] = time_str
+        accept_input(context, update.effective_chat.id)
         
         # Переход к следующему шагу
         await update.message.reply_text(
-            f"✅ *Время уведомлений установлено!*\n\n"
-            f"🕗 С {context.user_data['start_time']} до {context.user_data['end_time']}\n\n"
-            f"🏙️ *ШАГ 6 ИЗ 6: ГОРОД*\n\n"
-            f"Теперь укажите ваш город (примеры: Москва или New York)\n\n"
-            f"💡 *Зачем это нужно?* (необязательно)\n"
-            f"Если вы укажете город, каждое утро я буду присылать вам:\n"
-            f"• Прогноз погоды на день ☀️🌧️\n"
-            f"• Персонализированную рекомендацию по потреблению воды\n"
-            f"• Напоминания с учётом погодных условий\n\n"
-            f"👉 Если хотите пропустить этот шаг, нажмите кнопку ниже:",
+            t.format(
+                'register.custom_time_set',
+                start=context.user_data['start_time'],
+                end=context.user_data['end_time']
+            ) + "\n\n" + t.format('register.city'),
             parse_mode='Markdown',
-            reply_markup=get_city_keyboard()
+            reply_markup=get_city_keyboard(t)
         )
         return ASKING_CITY
         
-    except Exception as e:
-        await update.message.reply_text(
-            f"❌ *ОШИБКА: {str(e)}*\n\n"
-            "🕕 Пожалуйста, введите корректное время окончания:\n"
-            "• Максимум: 23:59\n"
-            "• Должно быть позже времени начала\n"
-            "• Диапазон не менее 4 часов\n\n"
-            "🕕 *Примеры правильного ввода:*\n"
-            "✅ 21:00\n"
-            "✅ 22:30\n\n"
-            "Попробуйте ещё раз или вернитесь к началу:",
-            parse_mode='Markdown',
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton("🔙 Вернуться к началу", callback_data='back_to_start_time')]
+    except ValueError as e:
+        await reply_invalid_input(
+            update,
+            context,
+            t.format('register.end_time_error', error=t.format(str(e))),
+            InlineKeyboardMarkup([
+                [InlineKeyboardButton(t.format('button.back_to_start_time'), callback_data='back_to_start_time')]
             ])
         )
         return AWAITING_END_TIME_INPUT
@@ -628,10 +593,7 @@ async def back_to_start_time(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['current_state'] = AWAITING_START_TIME_INPUT
     
     await query.message.reply_text(
-        "🕗 С какого времени начинать присылать уведомления?\n"
-        "Введите время в формате ЧЧ:ММ (пример: 09:30)\n\n"
-        "💡 Минимальное время: 06:00\n"
-        "Диапазон для уведомлений должен быть не менее 4 часов!",
+        get_texts(update).format('register.start_time_again'),
         parse_mode='Markdown',
         reply_markup=ReplyKeyboardRemove()
     )
@@ -644,6 +606,7 @@ async def back_to_start_time(update: Update, context: ContextTypes.DEFAULT_TYPE)
 # ШАГ 6: ЗАПРОС ГОРОДА
 async def handle_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка ввода города с валидацией"""
+    t = get_texts(update)
     if update.callback_query:
         query = update.callback_query
         await query.answer()
@@ -651,23 +614,48 @@ async def handle_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Обработка пропуска города
         if query.data == 'skip_city':
             context.user_data['city'] = None
-            await query.edit_message_text("⏭️ *Город пропущен!*\n\nПодготавливаю ваш профиль...", parse_mode='Markdown')
+            context.user_data['city_id'] = None
+            await query.edit_message_text(t.format('register.city_skipped'), parse_mode='Markdown')
             return await final_save(update, context)
         
         # Обработка возврата к предыдущему шагу
         if query.data == 'back_to_time':
             # Возврат к шагу времени уведомлений
             await query.edit_message_text(
-                "⏰ *ВРЕМЯ УВЕДОМЛЕНИЙ*\n\n"
-                "Когда вам удобно получать напоминания о питье воды? 💧\n\n"
-                "💡 *Зачем это нужно?*\n"
-                "Я рассчитаю оптимальное количество напоминаний в течение дня, "
-                "учитывая вашу норму воды и выбранный временной диапазон. "
-                "Каждое напоминание будет предлагать выпить примерно стакан воды (250 мл)! 🥤",
+                t.format('register.notification_time_again'),
                 parse_mode='Markdown',
-                reply_markup=get_notification_time_keyboard()
+                reply_markup=get_notification_time_keyboard(t)
             )
             return ASKING_NOTIFICATION_TIME
+        
+        # Выбор города из предложенных вариантов
+        if query.data.startswith('city_'):
+            city = get_city_index().by_id.get(query.data[len('city_'):])
+            if city is None:
+                await query.edit_message_text(
+                    t.format('city.unavailable'),
+                    reply_markup=get_city_keyboard(t)
+                )
+                return ASKING_CITY
+            context.user_data['city'] = city.name
+            context.user_data['city_id'] = city.id
+            await query.edit_message_text(t.format('register.city_chosen', city=city.name), parse_mode='Markdown')
+            return await final_save(update, context)
+        
+        # Города нет среди вариантов - сохраняем как ввёл пользователь
+        if query.data == 'keep_city_input':
+            city_name = context.user_data.pop('city_input', None)
+            # Устаревшая клавиатура (например, после перезапуска бота) - введённого текста нет
+            if city_name is None:
+                await query.edit_message_text(
+                    t.format('city.unavailable'),
+                    reply_markup=get_city_keyboard(t)
+                )
+                return ASKING_CITY
+            context.user_data['city'] = city_name
+            context.user_data['city_id'] = None
+            await query.edit_message_text(t.format('register.city_saved'), parse_mode='Markdown')
+            return await final_save(update, context)
     
     # Обработка текстового ввода города
     if update.message:
@@ -675,23 +663,30 @@ async def handle_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Валидация названия города
         if len(city_name) < 2 or len(city_name) > 50 or not re.match(r'^[а-яА-Яa-zA-ZёЁ\s\-]+$', city_name):
-            await update.message.reply_text(
-                "❌ *ОШИБКА ВВОДА!*\n\n"
-                "Название города должно:\n"
-                "• Содержать только буквы и пробелы\n"
-                "• Быть от 2 до 50 символов\n\n"
-                "🏙️ *Примеры правильного ввода:*\n"
-                "✅ Москва\n"
-                "✅ Санкт-Петербург\n"
-                "✅ New York\n"
-                "✅ Los Angeles\n\n"
-                "Попробуйте ещё раз или нажмите 'Пропустить':",
-                parse_mode='Markdown',
-                reply_markup=get_city_keyboard()
-            )
+            await reply_invalid_input(update, context, t.format('register.city_format_error'), get_city_keyboard(t))
             return ASKING_CITY
+        accept_input(context, update.effective_chat.id)
         
-        context.user_data['city'] = city_name
+        # Поиск в справочнике городов
+        city_index = get_city_index()
+        city = city_index.resolve(city_name)
+        if city is None:
+            suggestions = city_index.suggest(city_name)
+            if suggestions:
+                context.user_data['city_input'] = ' '.join(city_name.split())
+                await update.message.reply_text(
+                    t.format('city.suggestions'),
+                    parse_mode='Markdown',
+                    reply_markup=get_city_suggestions_keyboard(t, suggestions)
+                )
+                return ASKING_CITY
+            
+            # Города нет в справочнике - сохраняем как есть
+            context.user_data['city'] = ' '.join(city_name.split())
+            context.user_data['city_id'] = None
+        else:
+            context.user_data['city'] = city.name
+            context.user_data['city_id'] = city.id
     
     return await final_save(update, context)
 
@@ -714,10 +709,15 @@ async def final_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
         activity=context.user_data['activity'],
         start_time=start_time,
         end_time=end_time,
-        city=context.user_data.get('city')
+        city=context.user_data.get('city'),
+        city_id=context.user_data.get('city_id'),
+        language_code=user.language_code,
+        db_path=get_tenant(context).db_path
     )
+    remember_language(context, chat_id, user.language_code)
     
-    city_msg = f"🏙️ Город: {context.user_data['city']}\n" if context.user_data.get('city') else ""
+    t = get_texts(update)
+    city_msg = t.format('register.city_line', city=context.user_data['city']) + "\n" if context.user_data.get('city') else ""
     water_norm = calculate_water_norm((
         None, None,
         context.user_data['weight'],
@@ -728,31 +728,24 @@ async def final_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ))
     
     # Расчёт количества напоминаний
-    start_h, start_m = map(int, start_time.split(':'))
-    end_h, end_m = map(int, end_time.split(':'))
-    total_minutes = (end_h * 60 + end_m) - (start_h * 60 + start_m)
-    glass_size = 250  # мл
-    total_ml = float(water_norm) * 1000  # переводим литры в мл
-    num_reminders = max(1, int(total_ml / glass_size))
+    num_reminders = reminder_count(float(water_norm))
+    
+    # Добавление в расписание напоминаний
+    schedule_user(context, chat_id, context.user_data['weight'], context.user_data['activity'], start_time, end_time)
     
     # Финальное сообщение
-    final_message = (
-        f"🎉 *ПОЗДРАВЛЯЮ, {user.first_name}!*\n\n"
-        f"✅ *Все данные успешно сохранены!*\n\n"
-        f"📋 *Ваш профиль:*\n"
-        f"⚖️ Вес: {context.user_data['weight']} кг\n"
-        f"📏 Рост: {context.user_data['height']} см\n"
-        f"👤 Пол: {context.user_data['gender']}\n"
-        f"🏃‍♂️ Активность: {context.user_data['activity']}\n"
-        f"⏰ Уведомления: с {start_time} до {end_time}\n"
-        f"{city_msg}\n"
-        f"💧 *Ваша дневная норма воды: {water_norm} литров*\n"
-        f"🛎️ *Количество напоминаний: ~{num_reminders} раз в день*\n\n"
-        f"✨ *Что дальше?*\n"
-        f"• Я буду автоматически напоминать вам пить водичку! 💦\n"
-        f"• Каждое напоминание - примерно стакан воды (250 мл) 🥤\n"
-        f"• Если указан город - каждое утро получите прогноз погоды ☀️🌧️\n\n"
-        f"Спасибо, что заботитесь о своём здоровье! ❤️"
+    final_message = t.format(
+        'register.done',
+        name=user.first_name,
+        weight=context.user_data['weight'],
+        height=context.user_data['height'],
+        gender=gender_label(t, context.user_data['gender']),
+        activity=activity_label(t, context.user_data['activity']),
+        start=start_time,
+        end=end_time,
+        city_line=city_msg,
+        norm=water_norm,
+        reminders=num_reminders
     )
     
     if update.callback_query:
@@ -776,14 +769,10 @@ async def final_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # Обработка команды /cancel - но мы НЕ даём отменить регистрацию!
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Блокировка отмены регистрации"""
-    user = update.effective_user
+    t = get_texts(update)
     
     await update.message.reply_text(
-        "🚫 *РЕГИСТРАЦИЮ НЕЛЬЗЯ ОТМЕНИТЬ!*\n\n"
-        "❗️ Для корректной работы бота необходимо заполнить все данные.\n"
-        f"Вы на шаге: {get_current_step(context)}\n\n"
-        "💧 Помните: правильное потребление воды - это важно для вашего здоровья! ❤️\n"
-        "Пожалуйста, продолжите регистрацию.",
+        t.format('register.cancel_blocked', step=get_current_step(t, context)),
         parse_mode='Markdown',
         reply_markup=ReplyKeyboardRemove()
     )
@@ -802,14 +791,9 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif current_state == ASKING_NOTIFICATION_TIME or current_state in [AWAITING_START_TIME_INPUT, AWAITING_END_TIME_INPUT]:
         # Возврат к шагу времени уведомлений
         await update.message.reply_text(
-            "⏰ *ВРЕМЯ УВЕДОМЛЕНИЙ*\n\n"
-            "Когда вам удобно получать напоминания о питье воды? 💧\n\n"
-            "💡 *Зачем это нужно?*\n"
-            "Я рассчитаю оптимальное количество напоминаний в течение дня, "
-            "учитывая вашу норму воды и выбранный временной диапазон. "
-            "Каждое напоминание будет предлагать выпить примерно стакан воды (250 мл)! 🥤",
+            t.format('register.notification_time_again'),
             parse_mode='Markdown',
-            reply_markup=get_notification_time_keyboard()
+            reply_markup=get_notification_time_keyboard(t)
         )
         return ASKING_NOTIFICATION_TIME
     elif current_state == ASKING_CITY:
@@ -817,27 +801,737 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return await ask_weight(update, context)
 
-def get_current_step(context):
+def get_current_step(t, context):
     """Возвращает название текущего шага для сообщения"""
     state_map = {
-        ASKING_WEIGHT: "Запрос веса",
-        AWAITING_WEIGHT_INPUT: "Ввод веса",
-        ASKING_HEIGHT: "Запрос роста",
-        AWAITING_HEIGHT_INPUT: "Ввод роста",
-        ASKING_GENDER: "Выбор пола",
-        ASKING_ACTIVITY: "Выбор активности",
-        ASKING_NOTIFICATION_TIME: "Настройка времени уведомлений",
-        AWAITING_START_TIME_INPUT: "Ввод времени начала",
-        AWAITING_END_TIME_INPUT: "Ввод времени окончания",
-        ASKING_CITY: "Ввод города"
+        ASKING_WEIGHT: 'step.asking_weight',
+        AWAITING_WEIGHT_INPUT: 'step.awaiting_weight',
+        ASKING_HEIGHT: 'step.asking_height',
+        AWAITING_HEIGHT_INPUT: 'step.awaiting_height',
+        ASKING_GENDER: 'step.asking_gender',
+        ASKING_ACTIVITY: 'step.asking_activity',
+        ASKING_NOTIFICATION_TIME: 'step.asking_notification_time',
+        AWAITING_START_TIME_INPUT: 'step.awaiting_start_time',
+        AWAITING_END_TIME_INPUT: 'step.awaiting_end_time',
+        ASKING_CITY: 'step.asking_city'
     }
-    return state_map.get(context.user_data.get('current_state', ASKING_WEIGHT), "Начало регистрации")
+    return t.format(state_map.get(context.user_data.get('current_state', ASKING_WEIGHT), 'step.unknown'))
 
-# Основная функция
-def main():
-    init_db()
+# Создание инлайн-клавиатуры меню настроек
+def get_settings_keyboard(t):
+    keyboard = [
+        [
+            InlineKeyboardButton(t.format('button.settings_weight'), callback_data='settings_weight'),
+            InlineKeyboardButton(t.format('button.settings_activity'), callback_data='settings_activity')
+        ],
+        [
+            InlineKeyboardButton(t.format('button.settings_window'), callback_data='settings_window'),
+            InlineKeyboardButton(t.format('button.settings_city'), callback_data='settings_city')
+        ],
+        [InlineKeyboardButton(t.format('button.settings_done'), callback_data='settings_done')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# Создание инлайн-клавиатуры активности для настроек
+def get_settings_activity_keyboard(t):
+    keyboard = [
+        [
+            InlineKeyboardButton(t.format('button.activity_low'), callback_data='activity_low'),
+            InlineKeyboardButton(t.format('button.activity_medium'), callback_data='activity_medium'),
+            InlineKeyboardButton(t.format('button.activity_high'), callback_data='activity_high')
+        ],
+        [InlineKeyboardButton(t.format('button.settings_back'), callback_data='settings_back')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# Создание инлайн-клавиатуры для города в настройках
+def get_settings_city_keyboard(t):
+    keyboard = [
+        [InlineKeyboardButton(t.format('button.settings_clear_city'), callback_data='settings_clear_city')],
+        [InlineKeyboardButton(t.format('button.settings_back'), callback_data='settings_back')]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+# Текст профиля для меню настроек
+def format_settings_profile(t, db_user):
+    city_msg = t.format('settings.city_line', city=db_user[8]) + "\n" if db_user[8] else ""
+    return t.format(
+        'settings.profile',
+        weight=db_user[2],
+        activity=activity_label(t, db_user[5]),
+        start=db_user[6],
+        end=db_user[7],
+        city_line=city_msg,
+        norm=calculate_water_norm(db_user)
+    )
+
+# Пересчёт расписания одного пользователя после изменения профиля
+def refresh_user_schedule(context, db_user):
+    schedule_user(context, db_user[0], db_user[2], db_user[5], db_user[6], db_user[7])
+
+# Сохранение одного поля и возврат в меню настроек
+async def apply_settings_change(update: Update, context: ContextTypes.DEFAULT_TYPE, affects_schedule, **fields):
+    chat_id = update.effective_user.id
+    db_path = get_tenant(context).db_path
+    update_user(chat_id, db_path, **fields)
+    db_user = get_user(chat_id, db_path)
+    
+    # Норма и расписание зависят только от веса, активности и времени
+    if affects_schedule:
+        refresh_user_schedule(context, db_user)
+    
+    t = get_texts(update)
+    message_text = t.format('settings.changes_saved') + "\n\n" + format_settings_profile(t, db_user)
+    if update.callback_query:
+        await update.callback_query.edit_message_text(
+            message_text,
+            parse_mode='Markdown',
+            reply_markup=get_settings_keyboard(t)
+        )
+    else:
+        await update.message.reply_text(
+            message_text,
+            parse_mode='Markdown',
+            reply_markup=get_settings_keyboard(t)
+        )
+    return SETTINGS_MENU
+
+# Команда /settings - изменение отдельных полей профиля
+async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    db_user = get_user(update.effective_user.id, get_tenant(context).db_path)
+    t = get_texts(update)
+    
+    if not db_user:
+        await update.message.reply_text(
+            t.format('profile.missing'),
+            reply_markup=ReplyKeyboardRemove()
+        )
+        return ConversationHandler.END
+    
+    await update.message.reply_text(
+        format_settings_profile(t, db_user),
+        parse_mode='Markdown',
+        reply_markup=get_settings_keyboard(t)
+    )
+    return SETTINGS_MENU
+
+# Обработка выбора в меню настроек
+async def handle_settings_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    t = get_texts(update)
+    
+    if query.data == 'settings_weight':
+        await query.edit_message_text(t.format('settings.weight'), parse_mode='Markdown')
+        return SETTINGS_WEIGHT_INPUT
+    
+    if query.data == 'settings_activity':
+        await query.edit_message_text(
+            t.format('settings.activity'),
+            parse_mode='Markdown',
+            reply_markup=get_settings_activity_keyboard(t)
+        )
+        return SETTINGS_ACTIVITY
+    
+    if query.data == 'settings_window':
+        await query.edit_message_text(t.format('settings.window'), parse_mode='Markdown')
+        return SETTINGS_START_TIME_INPUT
+    
+    if query.data == 'settings_city':
+        await query.edit_message_text(
+            t.format('settings.city'),
+            parse_mode='Markdown',
+            reply_markup=get_settings_city_keyboard(t)
+        )
+        return SETTINGS_CITY_INPUT
+    
+    if query.data == 'settings_back':
+        await query.edit_message_text(
+            format_settings_profile(t, get_user(update.effective_user.id, get_tenant(context).db_path)),
+            parse_mode='Markdown',
+            reply_markup=get_settings_keyboard(t)
+        )
+        return SETTINGS_MENU
+    
+    # settings_done
+    await query.edit_message_text(t.format('settings.done'), parse_mode='Markdown')
+    return ConversationHandler.END
+
+# Ввод нового веса
+async def handle_settings_weight_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text.strip()
+    
+    if not re.match(r'^\d+(\.\d{1,2})?$', text) or not 30 <= float(text) <= 300:
+        await reply_invalid_input(update, context, get_texts(update).format('settings.weight_error'))
+        return SETTINGS_WEIGHT_INPUT
+    accept_input(context, update.effective_chat.id)
+    
+    return await apply_settings_change(update, context, True, weight=float(text))
+
+# Выбор нового уровня активности
+async def handle_settings_activity_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    
+    activity_map = {
+        'activity_low': 'низкий',
+        'activity_medium': 'средний',
+        'activity_high': 'высокий'
+    }
+    
+    return await apply_settings_change(update, context, True, activity_level=activity_map[query.data])
+
+# Ввод нового времени начала
+async def handle_settings_start_time_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    time_str = update.message.text.strip()
+    t = get_texts(update)
+    
+    try:
+        if not validate_time(time_str):
+            raise ValueError("error.time_format")
+        time_str = format_time(time_str)
+        check_start_time(time_str)
+    except ValueError as e:
+        await reply_invalid_input(update, context, t.format('settings.start_time_error', error=t.format(str(e))))
+        return SETTINGS_START_TIME_INPUT
+    accept_input(context, update.effective_chat.id)
+    
+    context.user_data['settings_start_time'] = time_str
+    await update.message.reply_text(t.format('settings.end_time', start=time_str), parse_mode='Markdown')
+    return SETTINGS_END_TIME_INPUT
+
+# Ввод нового времени окончания
+async def handle_settings_end_time_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    time_str = update.message.text.strip()
+    start_time = context.user_data['settings_start_time']
+    t = get_texts(update)
+    
+    try:
+        if not validate_time(time_str):
+            raise ValueError("error.time_format")
+        time_str = format_time(time_str)
+        check_time_window(start_time, time_str)
+    except ValueError as e:
+        await reply_invalid_input(
+            update,
+            context,
+            t.format('settings.end_time_error', error=t.format(str(e)), start=start_time)
+        )
+        return SETTINGS_END_TIME_INPUT
+    accept_input(context, update.effective_chat.id)
+    
+    context.user_data.pop('settings_start_time', None)
+    return await apply_settings_change(update, context, True, start_time=start_time, end_time=time_str)
+
+# Ввод нового города (текст или выбор из вариантов)
+async def handle_settings_city_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    t = get_texts(update)
+    if update.callback_query:
+        query = update.callback_query
+        await query.answer()
+        
+        if query.data == 'settings_clear_city' or query.data == 'skip_city':
+            return await apply_settings_change(update, context, False, city=None, city_id=None)
+        
+        if query.data == 'keep_city_input':
+            city_name = context.user_data.pop('city_input', None)
+            # Без введённого текста город не меняем, иначе он бы стёрся
+            if city_name is None:
+                await query.edit_message_text(
+                    t.format('city.unavailable'),
+                    reply_markup=get_settings_city_keyboard(t)
+                )
+                return SETTINGS_CITY_INPUT
+            return await apply_settings_change(update, context, False, city=city_name, city_id=None)
+        
+        city = get_city_index().by_id.get(query.data[len('city_'):])
+        if city is None:
+            await query.edit_message_text(
+                t.format('city.unavailable'),
+                reply_markup=get_settings_city_keyboard(t)
+            )
+            return SETTINGS_CITY_INPUT
+        return await apply_settings_change(update, context, False, city=city.name, city_id=city.id)
     
-    application = Application.builder().token("7502354287:AAGW-s-unwW_pOVrhvdpN0NBTq8-IDsIOvM").build()
+    city_name = update.message.text.strip()
+    
+    if len(city_name) < 2 or len(city_name) > 50 or not re.match(r'^[а-яА-Яa-zA-ZёЁ\s\-]+$', city_name):
+        await reply_invalid_input(update, context, t.format('settings.city_format_error'), get_settings_city_keyboard(t))
+        return SETTINGS_CITY_INPUT
+    accept_input(context, update.effective_chat.id)
+    
+    city_index = get_city_index()
+    city = city_index.resolve(city_name)
+    if city is not None:
+        return await apply_settings_change(update, context, False, city=city.name, city_id=city.id)
+    
+    suggestions = city_index.suggest(city_name)
+    if suggestions:
+        context.user_data['city_input'] = ' '.join(city_name.split())
+        await update.message.reply_text(
+            t.format('city.suggestions'),
+            parse_mode='Markdown',
+            reply_markup=get_city_suggestions_keyboard(t, suggestions)
+        )
+        return SETTINGS_CITY_INPUT
+    
+    return await apply_settings_change(update, context, False, city=' '.join(city_name.split()), city_id=None)
+
+# Выход из настроек по /cancel
+async def settings_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop('settings_start_time', None)
+    context.user_data.pop('city_input', None)
+    await update.message.reply_text(get_texts(update).format('settings.cancelled'))
+    return ConversationHandler.END
+
+# Команда /drink [мл] - записать выпитую воду
+async def drink(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_user.id
+    tenant = get_tenant(context)
+    db_user = get_user(chat_id, tenant.db_path)
+    t = get_texts(update)
+    
+    if not db_user:
+        await update.message.reply_text(t.format('profile.missing'))
+        return
+    
+    amount = GLASS_SIZE_ML
+    if context.args:
+        if not context.args[0].isdecimal() or not DRINK_MIN_ML <= int(context.args[0]) <= DRINK_MAX_ML:
+            await update.message.reply_text(t.format('drink.amount_error', min=DRINK_MIN_ML, max=DRINK_MAX_ML))
+            return
+        amount = int(context.args[0])
+    
+    record_intake(chat_id, amount, db_path=tenant.db_path, history_dir=tenant.history_dir)
+    today = date.today()
+    drunk_today = daily_totals(chat_id, today, today, tenant.history_dir).get(today, 0)
+    
+    # Обновление рейтингов групп, в которых участвует пользователь
+    water_norm = calculate_water_norm(db_user)
+    changes = context.application.bot_data['challenges'].record_score(
+        chat_id, adherence_score(drunk_today, float(water_norm) * 1000)
+    )
+    rank_lines = []
+    for _, title, old_rank, new_rank, total in changes:
+        if old_rank and old_rank != new_rank:
+            rank_lines.append(t.format('drink.rank_moved', title=escape_markdown(title), old=old_rank, new=new_rank, total=total))
+        else:
+            rank_lines.append(t.format('drink.rank', title=escape_markdown(title), rank=new_rank, total=total))
+    
+    await update.message.reply_text(
+        t.format('drink.recorded', amount=amount, drunk=f"{drunk_today / 1000:.2f}", norm=water_norm)
+        + ("\n\n" + "\n".join(rank_lines) if rank_lines else ""),
+        parse_mode='Markdown'
+    )
+
+# Команда /stats - выпитая вода за последние 7 дней
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_user.id
+    tenant = get_tenant(context)
+    db_user = get_user(chat_id, tenant.db_path)
+    t = get_texts(update)
+    
+    if not db_user:
+        await update.message.reply_text(t.format('profile.missing'))
+        return
+    
+    today = date.today()
+    first_day = today - timedelta(days=6)
+    totals = daily_totals(chat_id, first_day, today, tenant.history_dir)
+    norm_ml = float(calculate_water_norm(db_user)) * 1000
+    
+    lines = []
+    for offset in range(7):
+        day = first_day + timedelta(days=offset)
+        drunk = totals.get(day, 0)
+        mark = "✅" if drunk >= norm_ml else "💧"
+        lines.append(t.format('stats.day', mark=mark, day=day.strftime('%d.%m'), drunk=f"{drunk / 1000:.2f}"))
+    
+    await update.message.reply_text(
+        t.format('stats.title') + "\n\n"
+        + "\n".join(lines)
+        + "\n\n" + t.format('stats.norm', norm=calculate_water_norm(db_user)),
+        parse_mode='Markdown'
+    )
+
+# Проверка, что команда вызвана в группе
+async def require_group_chat(update: Update):
+    if update.effective_chat.type in ('group', 'supergroup'):
+        return True
+    await update.message.reply_text(get_texts(update).format('challenge.group_only'))
+    return False
+
+# Команда /join - участвовать в соревновании группы
+async def join_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_group_chat(update):
+        return
+    
+    user = update.effective_user
+    t = get_texts(update)
+    if not get_user(user.id, get_tenant(context).db_path):
+        await update.message.reply_text(t.format('challenge.register_first', name=user.first_name))
+        return
+    
+    chat = update.effective_chat
+    challenges = context.application.bot_data['challenges']
+    if challenges.join(chat.id, chat.title or str(chat.id), user.id):
+        await update.message.reply_text(t.format('challenge.joined', name=user.first_name))
+    else:
+        await update.message.reply_text(t.format('challenge.already_joined', name=user.first_name))
+
+# Команда /leave - выйти из соревнования группы
+async def leave_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_group_chat(update):
+        return
+    
+    user = update.effective_user
+    t = get_texts(update)
+    if context.application.bot_data['challenges'].leave(update.effective_chat.id, user.id):
+        await update.message.reply_text(t.format('challenge.left', name=user.first_name))
+    else:
+        await update.message.reply_text(t.format('challenge.not_joined', name=user.first_name))
+
+# Команда /top - рейтинг группы за сегодня
+async def top_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await require_group_chat(update):
+        return
+    
+    chat_id = update.effective_chat.id
+    challenges = context.application.bot_data['challenges']
+    entries = challenges.top(chat_id)
+    t = get_texts(update)
+    
+    if not entries:
+        await update.message.reply_text(t.format('challenge.empty'))
+        return
+    
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = [
+        t.format('challenge.top_line', place=medals.get(rank, f'{rank}.'), name=escape_markdown(name), percent=score // 10)
+        for rank, name, score in entries
+    ]
+    await update.message.reply_text(
+        t.format('challenge.top_title', members=challenges.members_count(chat_id)) + "\n\n"
+        + "\n".join(lines),
+        parse_mode='Markdown'
+    )
+
+# Команда /profile [секунды] - профилирование работающего бота (только для администраторов)
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    
+    if chat_id not in ADMIN_CHAT_IDS:
+        # Для остальных команда выглядит как неизвестная
+        return await handle_unknown_command(update, context)
+    
+    t = get_texts(update)
+    # Во время остановки новая сессия задержала бы сохранение состояния
+    if context.bot_data['lifecycle'].draining:
+        await update.message.reply_text(t.format('profiling.stopping'))
+        return
+    
+    # Сессия занимается сразу: второй бот процесса не начнёт свою параллельно
+    if not begin_session():
+        await update.message.reply_text(t.format('profiling.busy'))
+        return
+    
+    seconds = PROFILE_DEFAULT_SECONDS
+    if context.args and context.args[0].isdecimal():
+        seconds = min(max(int(context.args[0]), 1), PROFILE_MAX_SECONDS)
+    
+    try:
+        await update.message.reply_text(t.format('profiling.started', seconds=seconds))
+    except Exception:
+        end_session()
+        raise
+    
+    # Сессия идёт в фоне, чтобы не задерживать обработку других сообщений;
+    # при остановке бота она отменяется (см. serve)
+    context.bot_data['profile_task'] = context.application.create_task(
+        run_profile_session(context, chat_id, seconds, t)
+    )
+
+async def run_profile_session(context: ContextTypes.DEFAULT_TYPE, chat_id, seconds, t):
+    try:
+        report = await profile_for(seconds)
+        await context.bot.send_message(chat_id, report.summary()[:4000])
+        await context.bot.send_document(
+            chat_id,
+            document=report.full_report().encode('utf-8'),
+            filename=report_filename()
+        )
+    except asyncio.CancelledError:
+        logging.info("Профилирование прервано остановкой бота")
+        raise
+    except Exception as e:
+        logging.exception("Ошибка профилирования")
+        await context.bot.send_message(chat_id, t.format('profiling.failed', error=e))
+    finally:
+        end_session()
+
+# Загрузка расписания: из снимка, если профили не менялись, иначе из базы
+def load_scheduler(tenant):
+    version = get_profile_version(tenant.db_path)
+    scheduler = ReminderScheduler.restore_snapshot(tenant.snapshot_path, tag=version)
+    if scheduler is not None:
+        logging.info("Бот %s: расписание восстановлено из снимка: %d пользователей", tenant.name, len(scheduler))
+        return scheduler
+    
+    scheduler = ReminderScheduler()
+    conn = sqlite3.connect(tenant.db_path)
+    scheduler.load(iter_schedule_rows(conn))
+    conn.close()
+    logging.info(
+        "Бот %s: расписание загружено из базы: %d пользователей, %d байт",
+        tenant.name, len(scheduler), scheduler.memory_bytes()
+    )
+    return scheduler
+
+# Сохранение снимка расписания (периодически и при остановке)
+def save_schedule_snapshot(tenant, scheduler):
+    scheduler.save_snapshot(tenant.snapshot_path, tag=get_profile_version(tenant.db_path))
+
+async def save_schedule_snapshot_job(context: ContextTypes.DEFAULT_TYPE):
+    save_schedule_snapshot(get_tenant(context), context.application.bot_data['scheduler'])
+
+# Добавление или обновление расписания пользователя
+def schedule_user(context, chat_id, weight, activity, start_time, end_time):
+    scheduler = context.application.bot_data['scheduler']
+    if scheduler is None:
+        # Расписание ещё загружается в фоне - пользователь будет добавлен после загрузки
+        context.application.bot_data['pending_schedule'].append((chat_id, weight, activity, start_time, end_time))
+    else:
+        scheduler.add_user(chat_id, weight, activity, start_time, end_time)
+
+# Планирование напоминаний, пропущенных во время простоя бота
+def load_catchup_queue(tenant, scheduler):
+    policy = CONFIG.catchup_policy
+    # Не отправленные до прошлой остановки + пропущенные за время простоя
+    missed = take_pending_reminders(tenant.db_path)
+    span = catchup_range(get_watermark(tenant.db_path), scheduler.last_minute + 1)
+    if span is not None:
+        conn = sqlite3.connect(tenant.db_path)
+        for chat_id, count in missed_reminders(conn, *span).items():
+            missed[chat_id] = missed.get(chat_id, 0) + count
+        conn.close()
+    if not missed:
+        return None
+    
+    plan = plan_catchup(missed, policy)
+    logging.info(
+        "Бот %s: пропущено за простой: %d напоминаний у %d пользователей, политика %s, к отправке %d",
+        tenant.name, sum(missed.values()), len(missed), policy, len(plan)
+    )
+    return CatchupQueue(plan, monotonic()) if plan else None
+
+# Языки пользователей для напоминаний (храним только не язык по умолчанию)
+def load_reminder_languages(tenant):
+    conn = sqlite3.connect(tenant.db_path)
+    languages = {
+        chat_id: language_code
+        for chat_id, language_code in iter_language_codes(conn)
+        if resolve_locale(language_code) != DEFAULT_LOCALE
+    }
+    conn.close()
+    return languages
+
+def remember_language(context, chat_id, language_code):
+    languages = context.application.bot_data['reminder_languages']
+    if resolve_locale(language_code) != DEFAULT_LOCALE:
+        languages[chat_id] = language_code
+    else:
+        languages.pop(chat_id, None)
+
+# Текст напоминания (count > 1 - объединённое после простоя)
+def reminder_text(t, count=1):
+    if count > 1:
+        return t.format('reminder.missed', count=count, glass=GLASS_SIZE_ML)
+    return t.format('reminder.one', glass=GLASS_SIZE_ML)
+
+# Отправка наступивших напоминаний (вызывается каждую минуту)
+async def send_reminders(context: ContextTypes.DEFAULT_TYPE):
+    scheduler = context.application.bot_data['scheduler']
+    languages = context.application.bot_data['reminder_languages']
+    due = scheduler.tick()
+    # Запоминаем обработанную минуту до отправки: при падении во время
+    # рассылки напоминания не будут отправлены повторно
+    set_watermark(scheduler.last_minute, get_tenant(context).db_path)
+    for chat_id, _ in due:
+        try:
+            await context.bot.send_message(chat_id, reminder_text(get_catalog(languages.get(chat_id))))
+        except Exception as e:
+            logging.warning("Не удалось отправить напоминание %s: %s", chat_id, e)
+
+# Догоняющая отправка после простоя (вызывается каждую секунду)
+async def send_catchup_reminders(context: ContextTypes.DEFAULT_TYPE):
+    queue = context.application.bot_data.get('catchup_queue')
+    if queue is None:
+        context.job.schedule_removal()
+        return
+    
+    languages = context.application.bot_data['reminder_languages']
+    for chat_id, count in queue.pop_due(monotonic()):
+        try:
+            await context.bot.send_message(chat_id, reminder_text(get_catalog(languages.get(chat_id)), count))
+        except Exception as e:
+            logging.warning("Не удалось отправить догоняющее напоминание %s: %s", chat_id, e)
+    
+    if not len(queue):
+        context.application.bot_data['catchup_queue'] = None
+        context.job.schedule_removal()
+
+# Сжатие outbox: события, подтверждённые всеми потребителями
+async def compact_outbox_job(context: ContextTypes.DEFAULT_TYPE):
+    tenant = get_tenant(context)
+    deleted = compact_outbox(tenant.db_path)
+    if deleted:
+        logging.info("Бот %s: outbox: удалено подтверждённых событий: %d", tenant.name, deleted)
+
+# Резервная копия базы (в отдельном потоке, чтобы не блокировать обработчики)
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    tenant = get_tenant(context)
+    try:
+        path = await asyncio.to_thread(create_backup, tenant.db_path, tenant.backup_dir)
+        logging.info("Резервная копия создана: %s", path)
+        paths = await asyncio.to_thread(backup_history, tenant.history_dir, tenant.backup_dir)
+        logging.info("Резервная копия истории: %d файлов", len(paths))
+    except Exception:
+        logging.exception("Бот %s: не удалось создать резервную копию", tenant.name)
+
+# Сжатие закрытых месяцев истории в архивы
+async def compact_history_job(context: ContextTypes.DEFAULT_TYPE):
+    tenant = get_tenant(context)
+    try:
+        archived = await asyncio.to_thread(compact_closed_months, history_dir=tenant.history_dir)
+        for path in archived:
+            logging.info("История заархивирована: %s", path)
+    except Exception:
+        logging.exception("Бот %s: не удалось заархивировать историю", tenant.name)
+
+# Удаление старых очков соревнований
+async def prune_scores_job(context: ContextTypes.DEFAULT_TYPE):
+    context.application.bot_data['challenges'].prune_scores()
+
+# Загрузка того, что не нужно для первого обновления (в фоне после старта)
+async def warm_up_job(context: ContextTypes.DEFAULT_TYPE):
+    application = context.application
+    lifecycle = application.bot_data['lifecycle']
+    tenant = get_tenant(context)
+    
+    # Без расписания напоминания не запланировать: при ошибке повторяем
+    # загрузку, а /readyz отвечает 503, пока она не удастся
+    try:
+        with lifecycle.phase(f'{tenant.name}:load_scheduler'):
+            scheduler = await asyncio.to_thread(load_scheduler, tenant)
+        with lifecycle.phase(f'{tenant.name}:load_reminder_languages'):
+            languages = await asyncio.to_thread(load_reminder_languages, tenant)
+    except Exception:
+        logging.exception(
+            "Бот %s: не удалось загрузить расписание, повтор через %d с",
+            tenant.name, WARM_UP_RETRY_INTERVAL
+        )
+        application.job_queue.run_once(warm_up_job, WARM_UP_RETRY_INTERVAL)
+        return
+    
+    # Пользователи, зарегистрированные или изменённые во время загрузки
+    for profile in application.bot_data.pop('pending_schedule'):
+        scheduler.add_user(*profile)
+    application.bot_data['scheduler'] = scheduler
+    
+    # Изменения языка, сделанные во время загрузки, важнее прочитанных из базы
+    languages.update(application.bot_data['reminder_languages'])
+    application.bot_data['reminder_languages'] = languages
+    
+    # Ошибка догоняющей отправки не должна оставить бота без обычных напоминаний
+    try:
+        with lifecycle.phase(f'{tenant.name}:plan_catchup'):
+            application.bot_data['catchup_queue'] = await asyncio.to_thread(load_catchup_queue, tenant, scheduler)
+    except Exception:
+        logging.exception("Бот %s: не удалось спланировать догоняющие напоминания", tenant.name)
+    
+    job_queue = application.job_queue
+    job_queue.run_repeating(send_reminders, interval=60, first=1)
+    job_queue.run_repeating(
+        save_schedule_snapshot_job,
+        interval=SCHEDULE_SNAPSHOT_INTERVAL,
+        first=SCHEDULE_SNAPSHOT_INTERVAL
+    )
+    if application.bot_data['catchup_queue'] is not None:
+        job_queue.run_repeating(send_catchup_reminders, interval=1, first=1)
+    lifecycle.finish_warm_up(tenant.name)
+    logging.info("Бот %s: напоминания запланированы", tenant.name)
+
+# Сигнал остановки: перестаём принимать обновления и ограничиваем время завершения
+def request_shutdown(lifecycle, stopping, sig):
+    if lifecycle.draining:
+        return
+    lifecycle.start_draining()
+    logging.info(
+        "Получен %s: завершаем обработку, срок %.0f с",
+        signal.Signals(sig).name, CONFIG.shutdown_timeout
+    )
+    
+    watchdog = threading.Timer(CONFIG.shutdown_timeout, force_exit)
+    watchdog.daemon = True
+    watchdog.start()
+    
+    stopping.set()
+
+def force_exit():
+    logging.error("Завершение не уложилось в %.0f с, принудительный выход", CONFIG.shutdown_timeout)
+    logging.shutdown()
+    os._exit(1)
+
+# Сохранение состояния бота при остановке
+def save_tenant_state(application: Application):
+    tenant = application.bot_data['tenant']
+    
+    # Догоняющие напоминания, которые не успели отправить, - до следующего запуска
+    queue = application.bot_data.get('catchup_queue')
+    if queue is not None and len(queue):
+        pending = queue.remaining()
+        save_pending_reminders(pending, tenant.db_path)
+        logging.info(
+            "Бот %s: сохранено неотправленных догоняющих напоминаний: %d",
+            tenant.name, sum(pending.values())
+        )
+    
+    scheduler = application.bot_data.get('scheduler')
+    if scheduler is not None:
+        save_schedule_snapshot(tenant, scheduler)
+
+# Сборка бота: состояние в bot_data, периодические задачи и обработчики.
+# Соединения с Telegram и ограничитель запросов общие для всех ботов процесса
+def build_application(tenant, lifecycle, limiter, request, get_updates_request):
+    application = (
+        Application.builder()
+        .token(tenant.bot_token)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .rate_limiter(limiter.for_bot(tenant.name, tenant.rate_limit))
+        .build()
+    )
+    application.bot_data['tenant'] = tenant
+    application.bot_data['lifecycle'] = lifecycle
+    application.bot_data['scheduler'] = None
+    application.bot_data['pending_schedule'] = []
+    application.bot_data['challenges'] = Challenges(tenant.db_path)
+    application.bot_data['reminder_languages'] = {}
+    application.bot_data['catchup_queue'] = None
+    application.bot_data['throttle'] = ChatThrottle()
+    lifecycle.start_warm_up(tenant.name)
+    application.job_queue.run_once(warm_up_job, 0)
+    application.job_queue.run_repeating(compact_history_job, interval=HISTORY_COMPACT_INTERVAL, first=60)
+    application.job_queue.run_repeating(prune_scores_job, interval=HISTORY_COMPACT_INTERVAL, first=120)
+    application.job_queue.run_repeating(backup_job, interval=BACKUP_INTERVAL, first=BACKUP_INTERVAL)
+    application.job_queue.run_repeating(
+        compact_outbox_job,
+        interval=OUTBOX_COMPACT_INTERVAL,
+        first=OUTBOX_COMPACT_INTERVAL
+    )
+    
+    # Флуд из личного чата отсекается до диалогов и запросов к базе
+    application.add_handler(MessageHandler(filters.ChatType.PRIVATE, throttle_messages), group=-1)
     
     # ЕДИНСТВЕННЫЙ ConversationHandler для ВСЕХ состояний
     conv_handler = ConversationHandler(
@@ -888,6 +1582,8 @@ def main():
             ASKING_CITY: [
                 CallbackQueryHandler(handle_city_input, pattern='^skip_city$'),
                 CallbackQueryHandler(handle_city_input, pattern='^back_to_time$'),
+                CallbackQueryHandler(handle_city_input, pattern='^city_'),
+                CallbackQueryHandler(handle_city_input, pattern='^keep_city_input$'),
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_city_input)
             ]
         },
@@ -897,24 +1593,179 @@ def main():
     
     application.add_handler(conv_handler)
     
+    # Настройки профиля: изменение отдельных полей
+    settings_handler = ConversationHandler(
+        entry_points=[CommandHandler("settings", settings)],
+        states={
+            SETTINGS_MENU: [
+                CallbackQueryHandler(handle_settings_choice, pattern='^settings_')
+            ],
+            SETTINGS_WEIGHT_INPUT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_settings_weight_input)
+            ],
+            SETTINGS_ACTIVITY: [
+                CallbackQueryHandler(handle_settings_activity_choice, pattern='^activity_'),
+                CallbackQueryHandler(handle_settings_choice, pattern='^settings_back$')
+            ],
+            SETTINGS_START_TIME_INPUT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_settings_start_time_input)
+            ],
+            SETTINGS_END_TIME_INPUT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_settings_end_time_input)
+            ],
+            SETTINGS_CITY_INPUT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_settings_city_input),
+                CallbackQueryHandler(handle_settings_city_input, pattern='^(city_|keep_city_input$|skip_city$|settings_clear_city$)'),
+                CallbackQueryHandler(handle_settings_choice, pattern='^settings_back$')
+            ]
+        },
+        fallbacks=[CommandHandler("cancel", settings_cancel)],
+        allow_reentry=True
+    )
+    
+    application.add_handler(settings_handler)
+    
+    # Учёт выпитой воды
+    application.add_handler(CommandHandler("drink", drink))
+    application.add_handler(CommandHandler("stats", stats))
+    
+    # Групповые соревнования
+    application.add_handler(CommandHandler("join", join_challenge))
+    application.add_handler(CommandHandler("leave", leave_challenge))
+    application.add_handler(CommandHandler("top", top_challenge))
+    
+    # Профилирование для администраторов
+    application.add_handler(CommandHandler("profile", profile))
+    
     # Добавляем обработчик для всех остальных сообщений (игнорируем после завершения)
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_unknown_command))
+    # В группах на обычные сообщения не отвечаем
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE, handle_unknown_command))
     application.add_handler(CallbackQueryHandler(handle_unknown_callback))
     
-    application.run_polling()
+    return application
+
+# Запуск бота: getMe, задачи, получение обновлений
+async def start_application(application: Application):
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling()
+
+async def stop_application(application: Application):
+    if application.updater.running:
+        await application.updater.stop()
+    if application.running:
+        await application.stop()
+
+# Все боты процесса в одном цикле событий
+async def serve(tenants):
+    lifecycle = Lifecycle()
+    stopping = asyncio.Event()
+    
+    # Для первого обновления нужны только схема базы и обработчики; расписание,
+    # языки напоминаний и догоняющая отправка загружаются в фоне (warm_up_job)
+    with lifecycle.phase('init_db'):
+        for tenant in tenants:
+            prepare_tenant(tenant)
+            init_db(tenant.db_path)
+    
+    with lifecycle.phase('build_applications'):
+        limiter = OutboundLimiter()
+        # Один пул соединений на все боты; для getUpdates - по соединению на бота
+        request = HTTPXRequest(connection_pool_size=CONNECTION_POOL_SIZE)
+        get_updates_request = HTTPXRequest(connection_pool_size=len(tenants))
+        applications = [
+            build_application(tenant, lifecycle, limiter, request, get_updates_request)
+            for tenant in tenants
+        ]
+    
+    server = None
+    if CONFIG.health_port:
+        try:
+            server = await start_health_server(lifecycle, CONFIG.health_host, CONFIG.health_port)
+        except OSError as e:
+            # Занятый порт не должен мешать работе ботов
+            logging.error(
+                "Проверки состояния не запущены (%s:%d): %s",
+                CONFIG.health_host, CONFIG.health_port, e
+            )
+    
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, request_shutdown, lifecycle, stopping, sig)
+        except (NotImplementedError, RuntimeError):
+            # Windows: остановка по KeyboardInterrupt
+            pass
+    
+    try:
+        # Бот с неверным токеном не мешает запуску остальных
+        with lifecycle.phase('start_bots'):
+            results = await asyncio.gather(
+                *(start_application(application) for application in applications),
+                return_exceptions=True
+            )
+        started = 0
+        for tenant, result in zip(tenants, results):
+            if isinstance(result, Exception):
+                # Текст InvalidToken содержит сам токен - в журнал пишем только тип ошибки
+                logging.error("Бот %s не запущен: %s", tenant.name, type(result).__name__)
+                # Расписание не запущенного бота не загрузится - готовность от него не зависит
+                lifecycle.finish_warm_up(tenant.name)
+            else:
+                started += 1
+        if not started:
+            raise SystemExit("Ни один бот не запущен")
+        
+        logging.info("Запущено ботов: %d из %d", started, len(tenants))
+        lifecycle.mark_ready()
+        await stopping.wait()
+    finally:
+        # Профилирование длится до PROFILE_MAX_SECONDS - дольше срока остановки;
+        # Application.stop() ждёт его задачу, поэтому сессии отменяются
+        for application in applications:
+            task = application.bot_data.get('profile_task')
+            if task is not None and not task.done():
+                task.cancel()
+        
+        # Сначала все боты перестают получать обновления и дорабатывают
+        # начатое, затем сохраняется состояние и закрываются общие соединения
+        await asyncio.gather(
+            *(stop_application(application) for application in applications),
+            return_exceptions=True
+        )
+        for application in applications:
+            try:
+                save_tenant_state(application)
+            except Exception:
+                logging.exception("Бот %s: не удалось сохранить состояние", application.bot_data['tenant'].name)
+        await asyncio.gather(
+            *(application.shutdown() for application in applications),
+            return_exceptions=True
+        )
+        
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        
+        if lifecycle.drain_started_at is not None:
+            logging.info("Остановка завершена за %.1f с", monotonic() - lifecycle.drain_started_at)
+
+# Основная функция
+def main():
+    tenants = load_tenants()
+    if not tenants:
+        raise SystemExit("Не задан токен бота: переменная BOT_TOKEN, bot_token или tenants в config.json")
+    asyncio.run(serve(tenants))
 
 # Обработка неизвестных команд после завершения регистрации
 async def handle_unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Игнорирование текстовых сообщений после завершения диалога"""
-    if not get_user(update.effective_user.id):
+    if not get_user(update.effective_user.id, get_tenant(context).db_path):
         # Если пользователь не зарегистрирован, перенаправляем на старт
         return await start(update, context)
     
     await update.message.reply_text(
-        "💧 Я понимаю только команды! Используйте:\n"
-        "/drink - записать выпитую воду\n"
-        "/stats - посмотреть статистику\n"
-        "/update - обновить данные профиля",
+        get_texts(update).format('unknown.command'),
         reply_markup=ReplyKeyboardRemove()
     )
 
@@ -923,51 +1774,37 @@ async def handle_unknown_callback(update: Update, context: ContextTypes.DEFAULT_
     """Игнорирование старых кнопок после завершения диалога"""
     query = update.callback_query
     await query.answer()
+    t = get_texts(update)
     
-    if not get_user(update.effective_user.id):
+    if not get_user(update.effective_user.id, get_tenant(context).db_path):
         # Если пользователь не зарегистрирован
-        await query.edit_message_text(
-            "❌ Эта кнопка больше не активна. Пожалуйста, начните регистрацию командой /start"
-        )
+        await query.edit_message_text(t.format('unknown.button_unregistered'))
         return
     
-    await query.edit_message_text(
-        "💧 Эта кнопка больше не активна. Используйте команды:\n"
-        "/drink - записать выпитую воду\n"
-        "/stats - посмотреть статистику"
-    )
+    await query.edit_message_text(t.format('unknown.button'))
 
 # Обработка текстового ввода во время выбора с кнопками
 async def handle_invalid_text_during_choice(update: Update, context: ContextTypes.DEFAULT_TYPE, state):
     """Обработка текстового ввода когда ожидается выбор кнопок"""
+    t = get_texts(update)
     messages = {
-        ASKING_GENDER: (
-            "❌ *НЕПРАВИЛЬНЫЙ ВВОД!*\n\n"
-            "На этом шаге нужно выбрать пол, нажав на кнопку ниже.\n"
-            "Пожалуйста, используйте инлайн-кнопки для выбора."
-        ),
-        ASKING_ACTIVITY: (
-            "❌ *НЕПРАВИЛЬНЫЙ ВВОД!*\n\n"
-            "На этом шаге нужно выбрать уровень активности, нажав на кнопку ниже.\n"
-            "Пожалуйста, используйте инлайн-кнопки для выбора."
-        ),
-        ASKING_NOTIFICATION_TIME: (
-            "❌ *НЕПРАВИЛЬНЫЙ ВВОД!*\n\n"
-            "На этом шаге нужно выбрать вариант времени, нажав на кнопку ниже.\n"
-            "Пожалуйста, используйте инлайн-кнопки для выбора."
-        )
+        ASKING_GENDER: 'register.invalid_gender_text',
+        ASKING_ACTIVITY: 'register.invalid_activity_text',
+        ASKING_NOTIFICATION_TIME: 'register.invalid_time_text'
     }
     
     keyboards = {
-        ASKING_GENDER: get_gender_keyboard(),
-        ASKING_ACTIVITY: get_activity_keyboard(),
-        ASKING_NOTIFICATION_TIME: get_notification_time_keyboard()
+        ASKING_GENDER: get_gender_keyboard,
+        ASKING_ACTIVITY: get_activity_keyboard,
+        ASKING_NOTIFICATION_TIME: get_notification_time_keyboard
     }
     
-    await update.message.reply_text(
-        messages.get(state, "❌ Неправильный ввод! Пожалуйста, используйте кнопки ниже."),
-        parse_mode='Markdown',
-        reply_markup=keyboards.get(state, ReplyKeyboardRemove())
+    keyboard = keyboards.get(state)
+    await reply_invalid_input(
+        update,
+        context,
+        t.format(messages.get(state, 'register.invalid_text')),
+        keyboard(t) if keyboard else None
     )
     
     return state
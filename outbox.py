@@ -0,0 +1,123 @@
+"""Чтение событий об изменениях профилей для внешних сервисов.
+
+События пишутся в таблицу outbox в той же транзакции, что и само
+изменение (см. database.append_event). Каждый потребитель читает их
+по курсору (id строки) пачками и подтверждает обработанное; события,
+подтверждённые всеми потребителями, удаляются при сжатии. Пока нет ни
+одного потребителя, при сжатии удаляются события старше RETENTION_DAYS.
+
+Пример: вывод новых событий в формате JSON Lines с подтверждением
+    python outbox.py tail analytics --batch 5000
+"""
+import argparse
+import json
+import sqlite3
+import sys
+
+from database import DB_PATH
+
+# Размер пачки по умолчанию
+BATCH_SIZE = 1000
+
+# Сколько дней хранить события, если потребителей нет
+RETENTION_DAYS = 7
+
+# Регистрация потребителя (курсор начинается с текущего конца, если from_start=False)
+def register_consumer(name, from_start=True, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    if from_start:
+        start_id = 0
+    else:
+        start_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+    conn.execute(
+        "INSERT OR IGNORE INTO outbox_consumers (name, acked_id) VALUES (?, ?)",
+        (name, start_id)
+    )
+    conn.commit()
+    conn.close()
+
+# Пачка событий после подтверждённого курсора потребителя
+def fetch_events(name, limit=BATCH_SIZE, db_path=DB_PATH):
+    """Возвращает [(id, created_at, event_type, chat_id, payload)]"""
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT acked_id FROM outbox_consumers WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        conn.close()
+        raise KeyError(f"Потребитель не зарегистрирован: {name}")
+    events = [
+        (event_id, created_at, event_type, chat_id, json.loads(payload))
+        for event_id, created_at, event_type, chat_id, payload in conn.execute(
+            "SELECT id, created_at, event_type, chat_id, payload FROM outbox "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (row[0], limit)
+        )
+    ]
+    conn.close()
+    return events
+
+# Подтверждение обработки событий до last_id включительно
+def ack(name, last_id, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "UPDATE outbox_consumers SET acked_id = MAX(acked_id, ?) WHERE name = ?",
+        (last_id, name)
+    )
+    conn.commit()
+    conn.close()
+
+# Поток пачек событий; следующая пачка читается после подтверждения текущей
+def stream(name, batch_size=BATCH_SIZE, db_path=DB_PATH):
+    while True:
+        events = fetch_events(name, batch_size, db_path)
+        if not events:
+            return
+        yield events
+
+# Удаление событий, подтверждённых всеми потребителями
+# (без потребителей - старше retention_days)
+def compact(db_path=DB_PATH, retention_days=RETENTION_DAYS):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), MIN(acked_id) FROM outbox_consumers")
+    consumers, acked = cursor.fetchone()
+    if not consumers:
+        cursor.execute(
+            "DELETE FROM outbox WHERE created_at < datetime('now', ?)",
+            (f"-{retention_days} days",)
+        )
+    else:
+        cursor.execute("DELETE FROM outbox WHERE id <= ?", (acked,))
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+def main():
+    parser = argparse.ArgumentParser(description="События об изменениях профилей")
+    parser.add_argument('--db', default=DB_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    tail = commands.add_parser('tail', help="вывести новые события (JSON Lines) и подтвердить их")
+    tail.add_argument('consumer')
+    tail.add_argument('--batch', type=int, default=BATCH_SIZE)
+    commands.add_parser('compact', help="удалить подтверждённые всеми события")
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        print(f"Удалено событий: {compact(args.db)}")
+        return
+
+    register_consumer(args.consumer, db_path=args.db)
+    for events in stream(args.consumer, args.batch, args.db):
+        for event_id, created_at, event_type, chat_id, payload in events:
+            sys.stdout.write(json.dumps({
+                'id': event_id,
+                'created_at': created_at,
+                'type': event_type,
+                'chat_id': chat_id,
+                'payload': payload
+            }, ensure_ascii=False) + '\n')
+        sys.stdout.flush()
+        ack(args.consumer, events[-1][0], args.db)
+
+if __name__ == "__main__":
+    main()
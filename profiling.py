@@ -0,0 +1,169 @@
+"""Профилирование работающего процесса по команде администратора.
+
+Пока профилирование выключено, ничего не работает: поток-сэмплер и
+tracemalloc запускаются только на время сессии.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Функции, в которых поток ждёт событий (не считаются нагрузкой)
+IDLE_FUNCTIONS = {'select', 'poll', 'epoll', 'kqueue', '_run_once', 'wait'}
+
+# Интервал сэмплирования, сек
+SAMPLE_INTERVAL = 0.005
+# Глубина стека для tracemalloc
+TRACEMALLOC_FRAMES = 10
+
+# Сессия одна на процесс: tracemalloc и сэмплер общие для всех ботов
+_session_lock = threading.Lock()
+
+# Занять сессию; False - профилирование уже идёт
+def begin_session():
+    return _session_lock.acquire(blocking=False)
+
+def end_session():
+    _session_lock.release()
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+class SamplingProfiler:
+    """Периодически снимает стек выбранного потока из отдельного потока"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    # Топ функций: [(метка, собственные сэмплы, включая вызовы)]
+    def top_functions(self, limit=10, filename=None):
+        own = Counter()
+        total = Counter()
+        for stack, count in self.stacks.items():
+            if filename is None and stack[-1].co_name in IDLE_FUNCTIONS:
+                continue
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        if filename is not None:
+            # Включительное время функций выбранного файла (например, обработчиков)
+            entry = self._common_prefix()
+            codes = [
+                code for code in total
+                if os.path.basename(code.co_filename) == filename and code not in entry
+            ]
+            codes.sort(key=total.get, reverse=True)
+            return [(_frame_label(code), own[code], total[code]) for code in codes[:limit]]
+        return [(_frame_label(code), count, total[code]) for code, count in own.most_common(limit)]
+
+    # Общее начало всех стеков (точка входа: <module>, main, run_polling...)
+    def _common_prefix(self):
+        stacks = list(self.stacks)
+        if not stacks:
+            return set()
+        prefix = stacks[0]
+        for stack in stacks[1:]:
+            length = 0
+            while length < min(len(prefix), len(stack)) and prefix[length] is stack[length]:
+                length += 1
+            prefix = prefix[:length]
+        return set(prefix)
+
+    def idle_samples(self):
+        return sum(count for stack, count in self.stacks.items() if stack[-1].co_name in IDLE_FUNCTIONS)
+
+    # Свёрнутые стеки (формат flamegraph.pl / speedscope)
+    def collapsed(self):
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(f"{';'.join(_frame_label(code) for code in stack)} {count}")
+        return '\n'.join(lines)
+
+class ProfileReport:
+    def __init__(self, seconds, profiler, snapshot):
+        self.seconds = seconds
+        self.profiler = profiler
+        self.snapshot = snapshot
+
+    # Краткая сводка для сообщения (обычный текст, без разметки)
+    def summary(self, handlers_file='main.py', limit=10):
+        profiler = self.profiler
+        samples = profiler.samples or 1
+        lines = [
+            f"Профиль за {self.seconds} с: {profiler.samples} сэмплов, "
+            f"простой {profiler.idle_samples() * 100 // samples}%",
+            "",
+            "Топ функций (собств. / включ. сэмплы):"
+        ]
+        lines += [f"  {label}: {own} / {total}" for label, own, total in profiler.top_functions(limit)]
+        lines += ["", f"Обработчики {handlers_file} (включ. сэмплы):"]
+        lines += [f"  {label}: {total}" for label, _, total in profiler.top_functions(limit, handlers_file)]
+        lines += ["", "Топ мест выделения памяти:"]
+        for stat in self.snapshot.statistics('lineno')[:limit]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {os.path.basename(frame.filename)}:{frame.lineno}: "
+                f"{stat.size / 1024:.1f} КиБ в {stat.count} блоках"
+            )
+        return '\n'.join(lines)
+
+    # Полный отчёт для файла
+    def full_report(self):
+        parts = [self.summary(limit=30), "", "# Свёрнутые стеки", self.profiler.collapsed(), "", "# Выделения памяти (traceback)"]
+        for stat in self.snapshot.statistics('traceback')[:50]:
+            parts.append(f"{stat.size / 1024:.1f} КиБ в {stat.count} блоках")
+            parts.extend(f"    {line}" for line in stat.traceback.format())
+        return '\n'.join(parts)
+
+# Профилирование текущего потока (потока цикла событий) в течение `seconds`
+async def profile_for(seconds, interval=SAMPLE_INTERVAL):
+    profiler = SamplingProfiler(threading.get_ident(), interval)
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__)
+        ])
+        if started_tracemalloc:
+            tracemalloc.stop()
+    return ProfileReport(seconds, profiler, snapshot)
+
+# Имя файла с отчётом
+def report_filename():
+    return time.strftime('profile-%Y%m%d-%H%M%S.txt')
@@ -0,0 +1,90 @@
+"""Общий ограничитель исходящих запросов к Telegram для всех ботов процесса.
+
+У каждого бота свой лимит (Telegram считает запросы по токену): ведро
+токенов на бота, O(1) на запрос без фоновых задач. При ответе
+429 (RetryAfter) пауза ставится всему боту, а не одному запросу, и
+запрос повторяется после неё. getUpdates python-telegram-bot через
+ограничитель не пропускает.
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from time import monotonic
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+# Сколько раз повторять запрос после RetryAfter
+MAX_RETRIES = 2
+
+class TokenBucket:
+    """Ведро токенов с резервированием: очередь ожидающих не хранится,
+    каждый запрос сразу получает своё время отправки"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    # Задержка до отправки (токен резервируется сразу)
+    def reserve(self, now=None):
+        now = monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class OutboundLimiter:
+    """Один на процесс: ведро и пауза после 429 на каждого бота"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._paused_until = {}
+
+    # Ограничитель для Application.builder().rate_limiter(...)
+    def for_bot(self, name, rate):
+        self._buckets[name] = TokenBucket(rate)
+        return BotRateLimiter(self, name)
+
+    async def acquire(self, name):
+        delay = self._buckets[name].reserve()
+        paused_until = self._paused_until.get(name)
+        if paused_until is not None:
+            delay = max(delay, paused_until - monotonic())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, name, seconds):
+        until = monotonic() + seconds
+        if until > self._paused_until.get(name, 0):
+            self._paused_until[name] = until
+
+class BotRateLimiter(BaseRateLimiter):
+    """Привязка общего ограничителя к одному боту"""
+
+    def __init__(self, limiter, name):
+        self.limiter = limiter
+        self.name = name
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire(self.name)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning("Бот %s: лимит Telegram, пауза %s с (%s)", self.name, retry_after, endpoint)
+                self.limiter.pause(self.name, retry_after)
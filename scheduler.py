@@ -0,0 +1,365 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+# Размер одного стакана воды
+GLASS_SIZE_ML = 250
+
+# Коэффициенты для активности
+ACTIVITY_COEFFICIENTS = {
+    'низкий': 1.0,
+    'средний': 1.2,
+    'высокий': 1.5
+}
+
+MINUTES_PER_DAY = 24 * 60
+
+# Расчёт нормы воды в литрах
+def water_norm_liters(weight, activity_level):
+    # Базовый расчёт: 30 мл на 1 кг веса
+    base_norm = weight * 0.03
+    return base_norm * ACTIVITY_COEFFICIENTS.get(activity_level.lower(), 1.0)
+
+# Количество напоминаний (по стакану на каждое)
+def reminder_count(norm_liters):
+    return max(1, int(norm_liters * 1000 / GLASS_SIZE_ML))
+
+# Количество напоминаний для профиля (как в сообщении пользователю:
+# по норме, округлённой до 0.1 л)
+def user_reminder_count(weight, activity_level):
+    return reminder_count(round(water_norm_liters(weight, activity_level), 1))
+
+# Перевод 'ЧЧ:ММ' в минуты от начала суток
+def parse_time_minutes(time_str):
+    hours, minutes = map(int, time_str.split(':'))
+    return hours * 60 + minutes
+
+# Минута i-го напоминания: первое - в начале окна, последнее - в конце
+def reminder_minute(start, end, count, index):
+    span = end - start
+    if count <= 1 or span <= 0:
+        return start
+    return start + (index * span) // (count - 1)
+
+# Индекс первого напоминания не раньше минуты суток `minute_of_day`
+def first_reminder_index(start, end, count, minute_of_day):
+    span = end - start
+    offset = minute_of_day - start
+    if offset <= 0:
+        return 0
+    if count <= 1 or span <= 0:
+        return count
+    # Наименьший i, при котором start + i*span // (count-1) >= minute_of_day
+    return -(-offset * (count - 1) // span)
+
+# Абсолютная минута (номер дня * 1440 + минута суток)
+def absolute_minute(moment):
+    return moment.toordinal() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+# Часы реального времени
+class SystemClock:
+    def now(self):
+        return datetime.now()
+
+# Виртуальные часы для симуляции и тестов
+class VirtualClock:
+    def __init__(self, start):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def set(self, moment):
+        self._now = moment
+
+    def advance(self, delta):
+        self._now += delta
+
+# Формат снимка состояния: заголовок + массивы подряд
+SNAPSHOT_MAGIC = b'WTSCHED1'
+SNAPSHOT_HEADER = struct.Struct('<8sqqQQQ')
+
+# Общая пустая ячейка колеса: массив ячейки создаётся при первой записи,
+# поэтому пустое расписание (бот без пользователей) почти не занимает памяти
+_EMPTY_BUCKET = array('I')
+
+class ReminderScheduler:
+    """Планировщик напоминаний на основе колеса минут.
+
+    В колесе лежит ровно одна актуальная запись на пользователя - его
+    ближайшее напоминание. Устаревшие записи (после изменения профиля)
+    отбрасываются лениво при проходе по ячейке.
+
+    Состояние хранится в параллельных типизированных массивах по плотному
+    порядковому номеру пользователя (~22 байта на пользователя вместо ~230
+    у объектов и словарей). Номера загруженных из базы пользователей идут
+    по возрастанию chat_id и ищутся бинарным поиском, номера добавленных
+    позже - в небольшом словаре.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or SystemClock()
+        self._chat_ids = array('q')
+        self._start = array('H')
+        self._end = array('H')
+        # Количество напоминаний в день; 0 - пользователь неактивен
+        self._count = array('B')
+        # Номер ближайшего напоминания за день (осталось count - index)
+        self._index = array('B')
+        self._next_due = array('i')
+        self._sorted_count = 0
+        self._extra_ordinals = {}
+        self._active = 0
+        self._wheel = [_EMPTY_BUCKET] * MINUTES_PER_DAY
+        self._last_minute = absolute_minute(self.clock.now()) - 1
+
+    def __len__(self):
+        return self._active
+
+    def __contains__(self, chat_id):
+        ordinal = self._ordinal(chat_id)
+        return ordinal is not None and self._count[ordinal] > 0
+
+    @property
+    def last_minute(self):
+        return self._last_minute
+
+    # Порядковый номер пользователя или None
+    def _ordinal(self, chat_id):
+        ordinal = self._extra_ordinals.get(chat_id)
+        if ordinal is not None:
+            return ordinal
+        position = bisect_left(self._chat_ids, chat_id, 0, self._sorted_count)
+        if position < self._sorted_count and self._chat_ids[position] == chat_id:
+            return position
+        return None
+
+    def _new_ordinal(self, chat_id):
+        ordinal = len(self._chat_ids)
+        # Пока id приходят по возрастанию, они остаются в отсортированной части
+        if not self._extra_ordinals and ordinal == self._sorted_count and (
+            not ordinal or chat_id > self._chat_ids[ordinal - 1]
+        ):
+            self._sorted_count += 1
+        else:
+            self._extra_ordinals[chat_id] = ordinal
+        self._chat_ids.append(chat_id)
+        self._start.append(0)
+        self._end.append(0)
+        self._count.append(0)
+        self._index.append(0)
+        self._next_due.append(0)
+        return ordinal
+
+    # Добавление или замена расписания пользователя
+    def add_user(self, chat_id, weight, activity_level, start_time, end_time):
+        ordinal = self._ordinal(chat_id)
+        if ordinal is None:
+            ordinal = self._new_ordinal(chat_id)
+        if not self._count[ordinal]:
+            self._active += 1
+        self._start[ordinal] = parse_time_minutes(start_time)
+        self._end[ordinal] = parse_time_minutes(end_time)
+        self._count[ordinal] = min(user_reminder_count(weight, activity_level), 255)
+        self._schedule_from(ordinal, self._last_minute + 1)
+
+    def remove_user(self, chat_id):
+        # Запись в колесе станет устаревшей и будет отброшена при проходе
+        ordinal = self._ordinal(chat_id)
+        if ordinal is not None and self._count[ordinal]:
+            self._count[ordinal] = 0
+            self._active -= 1
+
+    # Загрузка расписаний из строк (chat_id, weight, activity_level, start_time, end_time)
+    def load(self, rows):
+        for chat_id, weight, activity_level, start_time, end_time in rows:
+            self.add_user(chat_id, weight, activity_level, start_time, end_time)
+
+    def next_due(self, chat_id):
+        ordinal = self._ordinal(chat_id)
+        if ordinal is None or not self._count[ordinal]:
+            return None
+        return self._next_due[ordinal]
+
+    def _wheel_append(self, slot, ordinal):
+        bucket = self._wheel[slot]
+        if bucket is _EMPTY_BUCKET:
+            bucket = self._wheel[slot] = array('I')
+        bucket.append(ordinal)
+
+    # Планирование ближайшего напоминания начиная с абсолютной минуты
+    def _schedule_from(self, ordinal, from_minute):
+        start = self._start[ordinal]
+        end = self._end[ordinal]
+        count = self._count[ordinal]
+        day_base = from_minute - from_minute % MINUTES_PER_DAY
+        index = first_reminder_index(start, end, count, from_minute - day_base)
+        if index >= count:
+            # На сегодня напоминания закончились - первое завтрашнее
+            day_base += MINUTES_PER_DAY
+            index = 0
+        self._index[ordinal] = index
+        next_due = self._next_due[ordinal] = day_base + reminder_minute(start, end, count, index)
+        self._wheel_append(next_due % MINUTES_PER_DAY, ordinal)
+
+    def tick(self):
+        """Возвращает напоминания, наступившие с прошлого вызова: [(chat_id, due_minute)]"""
+        now_minute = absolute_minute(self.clock.now())
+        due = []
+        for minute in range(self._last_minute + 1, now_minute + 1):
+            self._process_minute(minute, due)
+        if now_minute > self._last_minute:
+            self._last_minute = now_minute
+        return due
+
+    def advance_to(self, minute):
+        """Прокрутка до абсолютной минуты без отправки (после восстановления снимка)"""
+        for current in range(self._last_minute + 1, minute + 1):
+            self._process_minute(current, None)
+        if minute > self._last_minute:
+            self._last_minute = minute
+
+    def _process_minute(self, minute, due):
+        wheel = self._wheel
+        chat_ids = self._chat_ids
+        starts = self._start
+        ends = self._end
+        counts = self._count
+        indexes = self._index
+        next_dues = self._next_due
+        slot = minute % MINUTES_PER_DAY
+        day_base = minute - slot
+        bucket = wheel[slot]
+        if bucket is _EMPTY_BUCKET:
+            return
+        wheel[slot] = _EMPTY_BUCKET
+        for ordinal in bucket:
+            count = counts[ordinal]
+            if not count:
+                continue
+            next_due = next_dues[ordinal]
+            if next_due != minute:
+                # Запись на завтра в той же ячейке остаётся, прошлые - устаревшие
+                if next_due > minute and next_due % MINUTES_PER_DAY == slot:
+                    self._wheel_append(slot, ordinal)
+                continue
+            if due is not None:
+                due.append((chat_ids[ordinal], minute))
+            index = indexes[ordinal] + 1
+            if index >= count:
+                index = 0
+                base = day_base + MINUTES_PER_DAY
+            else:
+                base = day_base
+            indexes[ordinal] = index
+            next_due = next_dues[ordinal] = base + reminder_minute(starts[ordinal], ends[ordinal], count, index)
+            target = wheel[next_due % MINUTES_PER_DAY]
+            if target is _EMPTY_BUCKET:
+                target = wheel[next_due % MINUTES_PER_DAY] = array('I')
+            target.append(ordinal)
+
+    # Объём памяти состояния в байтах (массивы, колесо и словарь номеров)
+    def memory_bytes(self):
+        arrays = (self._chat_ids, self._start, self._end, self._count, self._index, self._next_due)
+        total = sum(item.buffer_info()[1] * item.itemsize for item in arrays)
+        total += sum(bucket.buffer_info()[1] * bucket.itemsize for bucket in self._wheel)
+        extra = self._extra_ordinals
+        total += sys.getsizeof(extra) + sum(
+            sys.getsizeof(chat_id) + sys.getsizeof(ordinal) for chat_id, ordinal in extra.items()
+        )
+        return total
+
+    def _snapshot_arrays(self):
+        offsets = array('I', [0])
+        for bucket in self._wheel:
+            offsets.append(offsets[-1] + len(bucket))
+        return [
+            self._chat_ids, self._start, self._end, self._count,
+            self._index, self._next_due, offsets
+        ] + self._wheel
+
+    def save_snapshot(self, path, tag=0):
+        """Сохранение состояния в файл через mmap (атомарная замена файла)
+
+        `tag` - метка версии данных (например, счётчик изменений профилей);
+        при восстановлении снимок с другой меткой не используется.
+        """
+        arrays = self._snapshot_arrays()
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, tag, self._last_minute,
+            len(self._chat_ids), self._sorted_count, sum(len(bucket) for bucket in self._wheel)
+        )
+        size = len(header) + sum(len(item) * item.itemsize for item in arrays)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w+b') as file:
+            file.truncate(size)
+            with mmap.mmap(file.fileno(), size) as mapped:
+                mapped[:len(header)] = header
+                position = len(header)
+                for item in arrays:
+                    data = item.tobytes()
+                    mapped[position:position + len(data)] = data
+                    position += len(data)
+                mapped.flush()
+        os.replace(temp_path, path)
+
+    @classmethod
+    def restore_snapshot(cls, path, tag=0, clock=None):
+        """Восстановление из снимка; None, если файла нет или метка не совпала"""
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) < SNAPSHOT_HEADER.size:
+                return None
+            magic, saved_tag, last_minute, users, sorted_count, wheel_total = SNAPSHOT_HEADER.unpack_from(mapped)
+            if magic != SNAPSHOT_MAGIC or saved_tag != tag:
+                return None
+            # 18 байт на пользователя + смещения и содержимое колеса
+            expected = SNAPSHOT_HEADER.size + users * 18 + (MINUTES_PER_DAY + 1 + wheel_total) * 4
+            if len(mapped) != expected:
+                return None
+
+            scheduler = cls(clock)
+            view = memoryview(mapped)
+            position = SNAPSHOT_HEADER.size
+
+            def read(typecode, length):
+                nonlocal position
+                item = array(typecode)
+                size = length * item.itemsize
+                item.frombytes(view[position:position + size])
+                position += size
+                return item
+
+            try:
+                scheduler._chat_ids = read('q', users)
+                scheduler._start = read('H', users)
+                scheduler._end = read('H', users)
+                scheduler._count = read('B', users)
+                scheduler._index = read('B', users)
+                scheduler._next_due = read('i', users)
+                offsets = read('I', MINUTES_PER_DAY + 1)
+                scheduler._wheel = [
+                    read('I', offsets[slot + 1] - offsets[slot])
+                    if offsets[slot + 1] > offsets[slot] else _EMPTY_BUCKET
+                    for slot in range(MINUTES_PER_DAY)
+                ]
+            finally:
+                view.release()
+
+        scheduler._sorted_count = sorted_count
+        scheduler._extra_ordinals = {
+            scheduler._chat_ids[ordinal]: ordinal
+            for ordinal in range(sorted_count, users)
+        }
+        scheduler._active = len(scheduler._count) - scheduler._count.count(0)
+        scheduler._last_minute = last_minute
+        # Пропущенные за время простоя минуты догоняет модуль catchup
+        scheduler.advance_to(absolute_minute(scheduler.clock.now()) - 1)
+        return scheduler
@@ -0,0 +1,167 @@
+"""Симуляция дня напоминаний на виртуальных часах.
+
+Пример запуска:
+    python simulation.py --users 1000000
+
+Ничего не отправляет: загружает синтетических пользователей в схему `users`,
+прокручивает сутки и записывает каждое решение планировщика.
+Используется как регрессионный бенчмарк для изменений в планировании.
+"""
+import argparse
+import csv
+import json
+import random
+import sqlite3
+import time as _time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from database import USERS_SCHEMA, iter_schedule_rows
+from scheduler import ReminderScheduler, VirtualClock, MINUTES_PER_DAY
+
+ACTIVITY_LEVELS = ('низкий', 'средний', 'высокий')
+GENDERS = ('мужской', 'женский')
+
+# Генерация синтетических пользователей в таблице users
+def generate_users(conn, count, seed=0):
+    rng = random.Random(seed)
+
+    def rows():
+        for chat_id in range(1, count + 1):
+            start = rng.randint(6 * 60, 11 * 60)
+            # Окно не меньше 4 часов и не позже 23:59
+            end = min(start + rng.randint(4 * 60, 16 * 60), 23 * 60 + 59)
+            yield (
+                chat_id,
+                f"user{chat_id}",
+                round(rng.uniform(40, 140), 1),
+                round(rng.uniform(150, 200), 1),
+                rng.choice(GENDERS),
+                rng.choice(ACTIVITY_LEVELS),
+                f"{start // 60:02d}:{start % 60:02d}",
+                f"{end // 60:02d}:{end % 60:02d}",
+                None
+            )
+
+    conn.execute(USERS_SCHEMA)
+    conn.executemany('''
+    INSERT OR REPLACE INTO users
+    (chat_id, first_name, weight, height, gender, activity_level, start_time, end_time, city)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows())
+    conn.commit()
+
+# Прогон суток на виртуальных часах
+def simulate_day(conn, day=None, tick_seconds=60, tick_offset=0, record=None):
+    """Возвращает словарь с метриками.
+
+    Отставание (skew) решения = время тика по виртуальным часам - плановое
+    время напоминания + процессорное время, потраченное на этот тик.
+    """
+    day = day or datetime(2024, 1, 1)
+    clock = VirtualClock(day)
+    scheduler = ReminderScheduler(clock)
+
+    started_wall = _time.perf_counter()
+    started_cpu = _time.process_time()
+    scheduler.load(iter_schedule_rows(conn))
+    load_cpu = _time.process_time() - started_cpu
+
+    per_minute = [0] * MINUTES_PER_DAY
+    skew_histogram = Counter()
+    tick_cpu_total = 0.0
+    tick_cpu_max = 0.0
+    decisions = 0
+
+    day_minute = absolute_day_minute(day)
+    clock.set(day + timedelta(seconds=tick_offset))
+    end = day + timedelta(days=1)
+    while clock.now() < end:
+        cpu_before = _time.process_time()
+        due = scheduler.tick()
+        tick_cpu = _time.process_time() - cpu_before
+        tick_cpu_total += tick_cpu
+        tick_cpu_max = max(tick_cpu_max, tick_cpu)
+
+        now = clock.now()
+        now_seconds = (now - day).total_seconds()
+        for chat_id, due_minute in due:
+            minute_of_day = due_minute - day_minute
+            per_minute[minute_of_day] += 1
+            skew_histogram[int(now_seconds - minute_of_day * 60 + tick_cpu)] += 1
+        if record is not None:
+            record(now, due)
+        decisions += len(due)
+        clock.advance(timedelta(seconds=tick_seconds))
+
+    peak_load = max(per_minute)
+    return {
+        'users': len(scheduler),
+        'state_bytes_per_user': round(scheduler.memory_bytes() / max(len(scheduler), 1), 1),
+        'decisions': decisions,
+        'peak_minute': f"{per_minute.index(peak_load) // 60:02d}:{per_minute.index(peak_load) % 60:02d}",
+        'peak_minute_load': peak_load,
+        'skew_seconds': _percentiles(skew_histogram, decisions),
+        'load_cpu_seconds': round(load_cpu, 3),
+        'tick_cpu_seconds': round(tick_cpu_total, 3),
+        'tick_cpu_max_seconds': round(tick_cpu_max, 4),
+        'wall_seconds': round(_time.perf_counter() - started_wall, 3)
+    }
+
+def absolute_day_minute(day):
+    return day.toordinal() * MINUTES_PER_DAY
+
+# Перцентили по гистограмме отставаний
+def _percentiles(histogram, total):
+    if not total:
+        return {}
+    result = {}
+    targets = [('p50', 0.50), ('p99', 0.99), ('max', 1.0)]
+    seen = 0
+    position = 0
+    for value in sorted(histogram):
+        seen += histogram[value]
+        while position < len(targets) and seen >= targets[position][1] * total:
+            result[targets[position][0]] = value
+            position += 1
+    result['mean'] = round(sum(v * c for v, c in histogram.items()) / total, 3)
+    return result
+
+# Запись решений в CSV: время тика, chat_id, плановая минута
+def csv_recorder(file):
+    writer = csv.writer(file)
+    writer.writerow(['tick_time', 'chat_id', 'due_minute'])
+
+    def record(now, due):
+        stamp = now.isoformat()
+        writer.writerows((stamp, chat_id, due_minute) for chat_id, due_minute in due)
+
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description="Симуляция суток напоминаний")
+    parser.add_argument('--users', type=int, default=100000, help="количество синтетических пользователей")
+    parser.add_argument('--db', default=':memory:', help="файл базы (по умолчанию в памяти)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tick', type=int, default=60, help="интервал тика планировщика, сек")
+    parser.add_argument('--tick-offset', type=int, default=0, help="сдвиг тиков относительно начала минуты, сек")
+    parser.add_argument('--record', help="CSV-файл для записи всех решений")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    started = _time.perf_counter()
+    generate_users(conn, args.users, args.seed)
+    generate_seconds = _time.perf_counter() - started
+
+    if args.record:
+        with open(args.record, 'w', newline='') as file:
+            report = simulate_day(conn, tick_seconds=args.tick, tick_offset=args.tick_offset, record=csv_recorder(file))
+    else:
+        report = simulate_day(conn, tick_seconds=args.tick, tick_offset=args.tick_offset)
+    conn.close()
+
+    report['generate_seconds'] = round(generate_seconds, 3)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Несколько ботов (white-label копии для партнёров) в одном процессе.
+
+Основной бот (bot_token) работает с прежними путями: db_path, history/,
+backups/, schedule_snapshot_path. Каждый бот из списка tenants получает
+свой каталог tenants_dir/<имя>/ с той же раскладкой: пользователи,
+история, соревнования и outbox разных ботов не пересекаются, а код
+хранилища не меняется - все его функции принимают db_path и history_dir.
+
+Пример config.json:
+    {"bot_token": "123:ABC", "tenants": [
+        {"name": "partner_a", "bot_token": "456:DEF"},
+        {"name": "partner_b", "bot_token": "789:GHI", "rate_limit": 10}
+    ]}
+
+Примеры (файлы бота для утилит backup.py, outbox.py и т.п.):
+    python tenants.py
+"""
+import os
+from collections import namedtuple
+
+from backup import BACKUP_DIR
+from config import CONFIG, MAIN_TENANT
+from history import HISTORY_DIR
+
+DB_NAME = 'water_tracker.db'
+SNAPSHOT_NAME = 'schedule.snapshot'
+
+Tenant = namedtuple(
+    'Tenant',
+    'name bot_token rate_limit db_path history_dir backup_dir snapshot_path'
+)
+
+# Бот партнёра: все файлы в tenants_dir/<имя>/
+def tenant_from_config(item, tenants_dir, rate_limit):
+    directory = os.path.join(tenants_dir, item.name)
+    return Tenant(
+        name=item.name,
+        bot_token=item.bot_token,
+        rate_limit=item.rate_limit or rate_limit,
+        db_path=os.path.join(directory, DB_NAME),
+        history_dir=os.path.join(directory, HISTORY_DIR),
+        backup_dir=os.path.join(directory, BACKUP_DIR),
+        snapshot_path=os.path.join(directory, SNAPSHOT_NAME)
+    )
+
+# Все боты процесса: основной (если задан bot_token) и боты партнёров
+def load_tenants(config=CONFIG):
+    tenants = []
+    if config.bot_token:
+        tenants.append(Tenant(
+            name=MAIN_TENANT,
+            bot_token=config.bot_token,
+            rate_limit=config.rate_limit,
+            db_path=config.db_path,
+            history_dir=HISTORY_DIR,
+            backup_dir=BACKUP_DIR,
+            snapshot_path=config.schedule_snapshot_path
+        ))
+    for item in config.tenants:
+        tenants.append(tenant_from_config(item, config.tenants_dir, config.rate_limit))
+    return tenants
+
+# Каталог базы и снимка (история и копии создают свои каталоги сами)
+def prepare_tenant(tenant):
+    for path in (tenant.db_path, tenant.snapshot_path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+def main():
+    for tenant in load_tenants():
+        print(f"{tenant.name}: база {tenant.db_path}, история {tenant.history_dir}, "
+              f"копии {tenant.backup_dir}, {tenant.rate_limit:g} запросов/с")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Ограничение частоты сообщений из одного чата.
+
+Два уровня:
+    check()         - скользящее окно перед всеми обработчиками: больше
+                      THROTTLE_LIMIT сообщений за THROTTLE_WINDOW секунд -
+                      пауза, сообщения за время паузы не обрабатываются.
+                      Пауза растёт при повторных нарушениях (COOLDOWNS)
+                      и сбрасывается после STRIKE_RESET секунд без них.
+    invalid_input() - повторный неверный ввод подряд получает один ответ
+                      об ошибке; следующий ответ - не раньше паузы из
+                      INVALID_COOLDOWNS, которая тоже растёт.
+
+Окно считается двумя счётчиками (текущее и прошлое окно с линейным весом),
+поэтому на чат хранится объект фиксированного размера. Чаты упорядочены
+по последнему сообщению и удаляются после expiry секунд тишины.
+"""
+from collections import OrderedDict
+from time import monotonic
+
+# Не больше THROTTLE_LIMIT сообщений за THROTTLE_WINDOW секунд
+THROTTLE_LIMIT = 8
+THROTTLE_WINDOW = 10
+# Паузы за первое, второе, ... нарушение, сек
+COOLDOWNS = (15, 60, 300, 900)
+# Через сколько секунд без нарушений счёт нарушений обнуляется
+STRIKE_RESET = 15 * 60
+# Паузы между ответами на неверный ввод подряд, сек
+INVALID_COOLDOWNS = (5, 15, 60)
+
+class _ChatState:
+    __slots__ = (
+        'seen', 'window_start', 'current', 'previous',
+        'strikes', 'blocked_until', 'invalid_streak', 'invalid_until'
+    )
+
+    def __init__(self, now):
+        self.seen = now
+        self.window_start = now
+        self.current = 0
+        self.previous = 0
+        self.strikes = 0
+        self.blocked_until = 0.0
+        self.invalid_streak = 0
+        self.invalid_until = 0.0
+
+class ChatThrottle:
+    def __init__(self, limit=THROTTLE_LIMIT, window=THROTTLE_WINDOW, cooldowns=COOLDOWNS,
+                 strike_reset=STRIKE_RESET, invalid_cooldowns=INVALID_COOLDOWNS):
+        self.limit = limit
+        self.window = window
+        self.cooldowns = cooldowns
+        self.strike_reset = strike_reset
+        self.invalid_cooldowns = invalid_cooldowns
+        # Состояние чата нужно, пока идёт пауза и помнится счёт нарушений
+        self.expiry = max(cooldowns) + strike_reset
+        self._chats = OrderedDict()
+
+    def __len__(self):
+        return len(self._chats)
+
+    # Состояние чата (создаётся при первом сообщении) и удаление устаревших
+    def _state(self, chat_id, now):
+        chats = self._chats
+        while chats:
+            oldest = next(iter(chats.values()))
+            if now - oldest.seen < self.expiry:
+                break
+            chats.popitem(last=False)
+
+        state = chats.get(chat_id)
+        if state is None:
+            state = chats[chat_id] = _ChatState(now)
+        else:
+            chats.move_to_end(chat_id)
+            state.seen = now
+        return state
+
+    def check(self, chat_id, now=None):
+        """Учёт сообщения: (обрабатывать ли, длительность новой паузы или None)
+
+        Длительность возвращается один раз - когда пауза только началась,
+        чтобы пользователь получил одно предупреждение.
+        """
+        now = monotonic() if now is None else now
+        state = self._state(chat_id, now)
+        if now < state.blocked_until:
+            return False, None
+
+        elapsed = now - state.window_start
+        if elapsed >= self.window:
+            # Прошлое окно - предыдущее, если оно было сразу перед текущим
+            state.previous = state.current if elapsed < 2 * self.window else 0
+            state.current = 0
+            state.window_start = now - elapsed % self.window
+            elapsed %= self.window
+        state.current += 1
+
+        estimate = state.previous * (self.window - elapsed) / self.window + state.current
+        if estimate <= self.limit:
+            return True, None
+
+        if state.strikes and now - state.blocked_until >= self.strike_reset:
+            state.strikes = 0
+        cooldown = self.cooldowns[min(state.strikes, len(self.cooldowns) - 1)]
+        state.strikes += 1
+        state.blocked_until = now + cooldown
+        # После паузы окно начинается заново
+        state.current = state.previous = 0
+        return False, cooldown
+
+    def invalid_input(self, chat_id, now=None):
+        """Неверный ввод: True - ответить об ошибке, False - ответ уже был недавно"""
+        now = monotonic() if now is None else now
+        state = self._state(chat_id, now)
+        if now < state.invalid_until:
+            return False
+        state.invalid_until = now + self.invalid_cooldowns[min(state.invalid_streak, len(self.invalid_cooldowns) - 1)]
+        state.invalid_streak += 1
+        return True
+
+    # Верный ввод: следующая ошибка снова получает ответ сразу
+    def valid_input(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is not None:
+            state.invalid_streak = 0
+            state.invalid_until = 0.0